@@ -0,0 +1,513 @@
+import time
+import tempfile
+import tracemalloc
+import glob
+import json
+import subprocess
+import sys
+import io
+import html
+import os
+import re
+import csv
+import argparse
+import platform
+import numpy as np
+import pandas as pd
+from web import source_to_df, csv_to_df, extract_table, TABLE_IDS
+from players import join_players
+from data import prepare_dfs
+from online import stream_stats
+from cache import load_dfs, clear_cache
+from rp_data import rp_data
+from plots import render
+from synthetic import write_league
+
+def timed(func, *args, repeat=3, **kwargs):
+  '''
+  Returns the best wall time in seconds of repeated calls
+
+  Parameters
+  ----------
+  func - function to time
+
+  repeat - int of number of calls
+
+  Returns
+  ----------
+  float
+
+  '''
+  best = float('inf')
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    best = min(best, time.perf_counter() - start)
+  return best
+
+def peak_memory(func, *args, **kwargs):
+  '''
+  Returns the result of a call and the peak bytes allocated while it ran, traced with tracemalloc
+
+  Parameters
+  ----------
+  func - function to trace
+
+  Returns
+  ----------
+  tuple of the result and int of peak bytes
+
+  '''
+  tracemalloc.start()
+  try:
+    result = func(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+  return result, peak
+
+def bench_ingest(directory='data', repeat=3):
+  '''
+  Compares reading every csv file with inferred dtypes (csv_to_df) against read_typed_csv
+
+  Parameters
+  ----------
+  directory - str of directory holding the scraped csv files
+
+  repeat - int of number of runs to take the best time of
+
+  Returns
+  ----------
+  dict of time in seconds, peak bytes allocated while parsing and bytes held by the frames for both paths
+
+  '''
+  files = sorted(glob.glob(f'{directory}/*-reliever*') + glob.glob(f'{directory}/*-value*'))
+  result = {}
+  for name, typed in (('inferred', False), ('typed', True)):
+    read_all = lambda: [csv_to_df(file, typed) for file in files]
+    dfs, peak = peak_memory(read_all)
+    result[name] = {'time': timed(read_all, repeat=repeat), 'peak': peak,
+                    'frame_bytes': int(sum(df.memory_usage(deep=True).sum() for df in dfs))}
+  return result
+
+def bench_cache(start_year=2015, end_year=2019, directory='data', repeat=3):
+  '''
+  Times loading the cleaned seasons with an empty cache (csv parsing and cleaning) against a warm cache
+
+  Parameters
+  ----------
+  start_year, end_year, directory - passed to load_dfs
+
+  repeat - int of number of runs to take the best time of
+
+  Returns
+  ----------
+  dict of cold and warm load times in seconds
+
+  '''
+  with tempfile.TemporaryDirectory() as cache_dir:
+    def cold():
+      clear_cache(cache_dir)
+      load_dfs(start_year, end_year, directory, cache_dir=cache_dir)
+    cold_time = timed(cold, repeat=repeat)
+    warm_time = timed(load_dfs, start_year, end_year, directory, cache_dir=cache_dir, repeat=repeat)
+  return {'cold': cold_time, 'warm': warm_time}
+
+def bench_join(directory='data', repeat=3):
+  '''
+  Compares pd.merge of each season on Name, Age and Tm against join_players over every season at once
+
+  Parameters
+  ----------
+  directory - str of directory holding the scraped csv files
+
+  repeat - int of number of runs to take the best time of
+
+  Returns
+  ----------
+  dict of seconds for each path and whether both match the same rows
+
+  '''
+  relievers = [csv_to_df(file) for file in sorted(glob.glob(f'{directory}/*-reliever*'))]
+  values = [csv_to_df(file) for file in sorted(glob.glob(f'{directory}/*-value*'))]
+  merge_all = lambda: [pd.merge(r, v, how='inner', on=['Name', 'Age', 'Tm']) for r, v in zip(relievers, values)]
+  all_relievers, all_values = pd.concat(relievers), pd.concat(values)
+  join_all = lambda: join_players(all_relievers, all_values)
+  merged, report = join_all()
+  same = sum(len(df[df['Name'] != 'Name']) for df in merge_all()) == len(merged) == report['matched'].sum()
+  return {'merge': timed(merge_all, repeat=repeat), 'join_players': timed(join_all, repeat=repeat), 'same': same}
+
+def bench_stream(start_year=2015, end_year=2019, directory='data', percentile=80, col_names=['RA9', 'RAA', 'RAR', 'WAA', 'WAR'],
+                 chunksize=250, repeat=3):
+  '''
+  Compares cleaning every season into memory with prepare_dfs against building the group statistics with stream_stats
+
+  Parameters
+  ----------
+  start_year, end_year, directory - seasons to read
+
+  percentile, col_names - passed to stream_stats
+
+  chunksize - int of reliever rows per chunk of the stream
+
+  repeat - int of number of runs to take the best time of
+
+  Returns
+  ----------
+  dict of time in seconds and peak bytes allocated for both paths
+
+  '''
+  def in_memory():
+    relievers, salaries = source_to_df(start_year, end_year, directory, typed=True)
+    return prepare_dfs(relievers, salaries, col_names)
+  streamed = lambda: stream_stats(start_year, end_year, percentile, col_names, directory, chunksize=chunksize)
+  result = {}
+  for name, func in (('in_memory', in_memory), ('stream', streamed)):
+    _, peak = peak_memory(func)
+    result[name] = {'time': timed(func, repeat=repeat), 'peak': peak}
+  return result
+
+def page_fixture(csv_file, page, commented=False, filler_rows=2000):
+  '''
+  Builds a baseball-reference style page from a scraped csv file: navigation filler, a team table and the
+  player table, optionally hidden inside an html comment the way the site ships some of its tables
+
+  Parameters
+  ----------
+  csv_file - str of path to a scraped csv file
+
+  page - 'value' or 'reliever'
+
+  commented - wrap the player table in an html comment
+
+  filler_rows - int of filler links around the tables
+
+  Returns
+  ----------
+  str of page source
+
+  '''
+  df = pd.read_csv(csv_file, index_col=0, dtype=str, keep_default_na=False)
+  cells = lambda row, tag: ''.join(f'<{tag}>{html.escape(value)}</{tag}>' for value in row)
+  rows = ''.join(f'<tr>{cells(row, "td")}</tr>' for row in df.itertuples(index=False))
+  table = (f'<table class="stats_table" id="{TABLE_IDS[page]}"><thead><tr>{cells(df.columns, "th")}</tr></thead>'
+           f'<tbody>{rows}</tbody></table>')
+  if commented:
+    table = f'<div class="placeholder"></div><!--\n{table}\n-->'
+  teams = ''.join(f'<tr><th>Team {i}</th><td>{i}</td><td>{i * 3}</td></tr>' for i in range(30))
+  filler = ''.join(f'<li><a href="/players/{i}.shtml">Player {i}</a></li>' for i in range(filler_rows))
+  return (f'<html><head><title>{page}</title></head><body><ul>{filler}</ul>'
+          f'<table id="teams_{page}_pitching"><thead><tr><th>Tm</th><th>G</th><th>IP</th></tr></thead><tbody>{teams}</tbody></table>'
+          f'{table}<ul>{filler}</ul></body></html>')
+
+def bench_extract(directory='data', repeat=3):
+  '''
+  Compares pd.read_html on the whole page against extract_table on page fixtures built from the csv files
+
+  Parameters
+  ----------
+  directory - str of directory holding the scraped csv files
+
+  repeat - int of number of runs to take the best time of
+
+  Returns
+  ----------
+  dict of seconds to parse every fixture with each path, and whether both return the same tables
+
+  '''
+  pages = [(page_fixture(file, page), page) for page in TABLE_IDS for file in sorted(glob.glob(f'{directory}/*-{page}.csv'))]
+  read_all = lambda: [pd.read_html(io.StringIO(source))[-1] for source, page in pages]
+  extract_all = lambda: [extract_table(source, TABLE_IDS[page]) for source, page in pages]
+  same = all(a.equals(b) for a, b in zip(read_all(), extract_all()))
+  commented = [(page_fixture(file, page, commented=True), page) for source, page in pages[:1]
+               for file in sorted(glob.glob(f'{directory}/*-{page}.csv'))[:1]]
+  found_commented = all(extract_table(source, TABLE_IDS[page]).shape == extract_all()[0].shape for source, page in commented)
+  return {'read_html': timed(read_all, repeat=repeat), 'extract_table': timed(extract_all, repeat=repeat),
+          'same': same, 'commented': found_commented}
+
+# Datasets of the suite: bundled seasons scaled by a factor of repeated players, or cycled to a number of seasons
+DATASETS = {'bundled': (1, None), '10x': (10, None), '100x': (100, None), '50seasons': (1, 50)}
+# Generated leagues of a number of seasons and pitchers per season, the same seed every run
+SYNTHETIC_DATASETS = {'synthetic': (50, 2000)}
+SUITE_COLS = ['RA9', 'RAA', 'RAR', 'WAA', 'WAR']
+BENCHMARK_HISTORY = 'benchmark_history.jsonl'
+
+def scaled_copy(directory, out_dir, factor=1, n_seasons=None):
+  '''
+  Writes copies of the scraped csv files with every player repeated factor times, the copies renamed so they still join
+  one to one, and with the seasons cycled to n_seasons ending at the latest season. The repeated header rows and the
+  league total row are written once, as they are in the scraped files.
+
+  Parameters
+  ----------
+  directory - str of directory holding the scraped csv files
+
+  out_dir - str of directory to write to
+
+  factor - int of copies of each player
+
+  n_seasons - int of seasons to write, None keeps the scraped seasons
+
+  Returns
+  ----------
+  tuple of int of first and last season written
+
+  '''
+  years = sorted(int(re.findall(r'\d{4}', os.path.basename(file))[0]) for file in glob.glob(f'{directory}/*-reliever.csv'))
+  n_seasons = n_seasons or len(years)
+  targets = range(years[-1] - n_seasons + 1, years[-1] + 1)
+  os.makedirs(out_dir, exist_ok=True)
+  for i, year in enumerate(targets):
+    source = years[(i - n_seasons) % len(years)]
+    for page in ('reliever', 'value'):
+      with open(f'{directory}/{source}-{page}.csv', newline='') as f:
+        header, *rows = list(csv.reader(f))
+      players = [row for row in rows if row[1].isdigit()]
+      with open(f'{out_dir}/{year}-{page}.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+        for k in range(1, factor):
+          writer.writerows([row[:2] + [f'{row[2]} {k}'] + row[3:] for row in players])
+  return targets[0], targets[-1]
+
+def suite_stages(directory, start_year, end_year, cache_dir, figure_dir, n_simulations=1000):
+  '''
+  Returns the stages of the main.py pipeline and the main rp_data methods as functions to time, built on one run of the pipeline.
+  rp_data methods clear the split cache first so every call splits the seasons again.
+
+  Parameters
+  ----------
+  directory - str of directory holding the csv files
+
+  start_year, end_year - int of seasons to load
+
+  cache_dir - str of empty directory for load_dfs
+
+  figure_dir - str of directory to render figures to
+
+  n_simulations - number of bootstrap resamples
+
+  Returns
+  ----------
+  list of tuples of stage name and function
+
+  '''
+  relievers, salaries = source_to_df(start_year, end_year, directory, typed=True)
+  dfs = prepare_dfs(relievers, salaries, SUITE_COLS)
+  data = rp_data(dfs)
+  year, years = int(data.years[0]), [int(year) for year in data.years]
+  results = [data.bootstrap(year, 80, 'RA9', n_simulations, rng=0, plot=False), data.scatter(year, 80, 'RA9', plot=False)]
+  def cold():
+    clear_cache(cache_dir)
+    return load_dfs(start_year, end_year, directory, SUITE_COLS, cache_dir=cache_dir)
+  def fresh(method, *args, **kwargs):
+    def call():
+      data.clear_split_cache()
+      return method(*args, **kwargs)
+    return call
+  return [('ingest', lambda: source_to_df(start_year, end_year, directory, typed=True)),
+          ('join', lambda: join_players(pd.concat(relievers), pd.concat(salaries))),
+          ('clean', lambda: prepare_dfs(relievers, salaries, SUITE_COLS)),
+          ('load_dfs_cold', cold),
+          ('load_dfs_warm', lambda: load_dfs(start_year, end_year, directory, SUITE_COLS, cache_dir=cache_dir)),
+          ('stream_stats', lambda: stream_stats(start_year, end_year, 80, SUITE_COLS, directory)),
+          ('rp_data', lambda: rp_data(dfs)),
+          ('create_df', fresh(data.create_df, year, 80, SUITE_COLS)),
+          ('create_sum_df', fresh(data.create_sum_df, 80, SUITE_COLS)),
+          ('sum_data', fresh(data.sum_data, 80, 'RA9')),
+          ('sum_accumulators', fresh(data.sum_accumulators, 80, SUITE_COLS)),
+          ('test_table', fresh(data.test_table, years, [60, 70, 80, 90], SUITE_COLS)),
+          ('percentile_sweep', fresh(data.percentile_sweep, 'all', SUITE_COLS)),
+          ('rate_tests', fresh(data.rate_tests, years + ['all'], [60, 70, 80, 90])),
+          ('bootstrap', fresh(data.bootstrap, year, 80, 'RA9', n_simulations, rng=0, plot=False)),
+          ('bootstrap_sum', fresh(data.bootstrap_sum, 80, 'RA9', n_simulations, rng=0, plot=False)),
+          ('bootstrap_grid', fresh(data.bootstrap_grid, [year, 'all'], [70, 80], SUITE_COLS, n_simulations, seed=0)),
+          ('confidence_intervals', fresh(data.confidence_intervals, 'all', 80, SUITE_COLS, n_simulations, rng=0)),
+          ('permutation_tests', fresh(data.permutation_tests, years + ['all'], [80], SUITE_COLS, 10 * n_simulations, seed=0)),
+          ('regression', fresh(data.regression, SUITE_COLS, se='bootstrap', n_simulations=n_simulations, rng=0)),
+          ('panel', lambda: data.panel().top_value(10, years=years)),
+          ('render', lambda: render(results, figure_dir))]
+
+def run_suite(datasets=('bundled', '10x', '100x', '50seasons'), directory='data', repeat=3, n_simulations=1000):
+  '''
+  Times every stage of suite_stages and traces its peak memory on each dataset, built from the scraped csv files in a temporary directory.
+  Each stage runs once untimed first.
+
+  Parameters
+  ----------
+  datasets - list of keys of DATASETS or SYNTHETIC_DATASETS
+
+  directory - str of directory holding the scraped csv files
+
+  repeat - int of number of runs to take the best time of
+
+  n_simulations - number of bootstrap resamples
+
+  Returns
+  ----------
+  dict of run metadata and, for each dataset, its rows and the time in seconds and peak bytes of each stage
+
+  '''
+  try:
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    commit = None
+  result = {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'repeat': repeat, 'n_simulations': n_simulations, 'datasets': {}}
+  for name in datasets:
+    with tempfile.TemporaryDirectory() as tmp:
+      if name in SYNTHETIC_DATASETS:
+        n_seasons, n_players = SYNTHETIC_DATASETS[name]
+        start_year, end_year = write_league(f'{tmp}/data', 1970, n_seasons, n_players, seed=0)
+      else:
+        factor, n_seasons = DATASETS[name]
+        start_year, end_year = scaled_copy(directory, f'{tmp}/data', factor, n_seasons)
+      stages = suite_stages(f'{tmp}/data', start_year, end_year, f'{tmp}/cache', f'{tmp}/figures', n_simulations)
+      rows = sum(len(csv_to_df(file, typed=True)) for file in glob.glob(f'{tmp}/data/*-reliever.csv'))
+      result['datasets'][name] = {'rows': rows, 'stages': {}}
+      for stage, func in stages:
+        func() # warm up, so lazy imports and first call caches are not counted
+        _, peak = peak_memory(func)
+        result['datasets'][name]['stages'][stage] = {'time': timed(func, repeat=repeat), 'peak': peak}
+  return result
+
+def save_result(result, path=BENCHMARK_HISTORY):
+  '''
+  Appends a run_suite result to the history file, one json object per line
+  '''
+  with open(path, 'a') as f:
+    f.write(json.dumps(result, sort_keys=True) + '\n')
+
+def load_history(path=BENCHMARK_HISTORY):
+  '''
+  Returns every run_suite result stored in the history file, oldest first
+  '''
+  if not os.path.exists(path):
+    return []
+  with open(path) as f:
+    return [json.loads(line) for line in f if line.strip()]
+
+def compare_results(new, old, threshold=1.25):
+  '''
+  Lists the stages that got slower or allocated more between two run_suite results
+
+  Parameters
+  ----------
+  new, old - dicts returned by run_suite
+
+  threshold - float of ratio of new over old above which a stage counts as a regression
+
+  Returns
+  ----------
+  list of str of regressions, empty when there are none
+
+  '''
+  regressions = []
+  for name, dataset in new['datasets'].items():
+    previous = old['datasets'].get(name, {}).get('stages', {})
+    for stage, row in dataset['stages'].items():
+      for metric in ('time', 'peak'):
+        before = previous.get(stage, {}).get(metric)
+        if before and row[metric] / before > threshold:
+          regressions.append(f'{name} {stage} {metric}: {before:.4g} -> {row[metric]:.4g} ({row[metric] / before:.2f}x, since {old["commit"]})')
+  return regressions
+
+# Modules an analysis-only run should not load at import time, and its import budget in seconds.
+HEAVY_MODULES = ['selenium', 'matplotlib', 'scipy']
+IMPORT_BUDGET = 1.0
+
+def import_time(modules=('data', 'cache', 'rp_data', 'plots')):
+  '''
+  Imports modules in a fresh interpreter with -X importtime
+
+  Parameters
+  ----------
+  modules - list of str of module names
+
+  Returns
+  ----------
+  tuple of float of cumulative import seconds and list of the HEAVY_MODULES that got imported
+
+  '''
+  code = (f"import sys, json; import {', '.join(modules)}; "
+          f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+  proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, check=True)
+  total = 0
+  for line in proc.stderr.splitlines():
+    fields = line.split('|')
+    # top level imports are the ones whose name is not indented
+    if len(fields) == 3 and fields[1].strip().isdigit() and not fields[2].startswith('  '):
+      total += int(fields[1])
+  return total / 1e6, json.loads(proc.stdout)
+
+def check_import_budget(seconds, heavy, modules=('data', 'cache', 'rp_data', 'plots'), budget=IMPORT_BUDGET):
+  '''
+  Checks that importing the analysis modules stays under budget and leaves selenium, matplotlib and scipy unloaded
+
+  Parameters
+  ----------
+  seconds, heavy - result of import_time(modules)
+
+  modules - list of str of module names
+
+  budget - float of seconds
+
+  Returns
+  ----------
+  list of str of failures, empty when within budget
+
+  '''
+  failures = []
+  if seconds > budget:
+    failures.append(f'importing {", ".join(modules)} took {seconds:.3f}s, budget is {budget}s')
+  if heavy:
+    failures.append(f'importing {", ".join(modules)} loaded {", ".join(heavy)}')
+  return failures
+
+def print_result(result):
+  for name, dataset in result['datasets'].items():
+    print(f"{name} ({dataset['rows']} reliever rows)")
+    width = max(map(len, dataset['stages']), default=0) + 2
+    for stage, row in dataset['stages'].items():
+      print(f"  {stage:<{width}}{row['time']:>10.4f}s{row['peak'] / 2**20:>10.1f} MiB")
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmarks of the csv ingest, cleaning, tests, bootstrap and plotting')
+  parser.add_argument('--suite', nargs='*', choices=list(DATASETS) + list(SYNTHETIC_DATASETS), help='time every pipeline stage on these datasets, all of them when none are given')
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--save', action='store_true', help=f'append the suite result to {BENCHMARK_HISTORY}')
+  parser.add_argument('--compare', action='store_true', help='fail on stages slower than the last saved result')
+  parser.add_argument('--threshold', type=float, default=1.25)
+  parser.add_argument('--check-imports', action='store_true', help=f'only check the import time budget of {IMPORT_BUDGET}s, failing when it is exceeded')
+  args = parser.parse_args()
+  if args.check_imports or args.suite is None:
+    seconds, heavy = import_time()
+    print(f"import time: {seconds:.3f}s (budget {IMPORT_BUDGET}s)")
+    failures = check_import_budget(seconds, heavy)
+    if args.check_imports:
+      sys.exit('\n'.join(failures) or None)
+  if args.suite is not None:
+    result = run_suite(args.suite or list(DATASETS) + list(SYNTHETIC_DATASETS), repeat=args.repeat)
+    print_result(result)
+    history = load_history()
+    if args.save:
+      save_result(result)
+    if args.compare and history:
+      regressions = compare_results(result, history[-1], args.threshold)
+      if regressions:
+        sys.exit('\n'.join(regressions))
+    sys.exit()
+  for name, row in bench_ingest().items():
+    print(f"csv ingest {name}: {row['time']:.4f}s  peak {row['peak'] / 2**20:.1f} MiB  frames {row['frame_bytes'] / 2**20:.1f} MiB")
+  for name, row in bench_stream().items():
+    print(f"season stats {name}: {row['time']:.4f}s  peak {row['peak'] / 2**20:.1f} MiB")
+  result = bench_join()
+  print(f"season join pd.merge: {result['merge']:.4f}s  join_players: {result['join_players']:.4f}s  same rows: {result['same']}")
+  result = bench_extract()
+  print(f"html tables read_html: {result['read_html']:.4f}s  extract_table: {result['extract_table']:.4f}s  "
+        f"same tables: {result['same']}  commented table found: {result['commented']}")
+  result = bench_cache()
+  print(f"cache cold load: {result['cold']:.4f}s  warm load: {result['warm']:.4f}s  speedup: {result['cold'] / result['warm']:.1f}x")
+  if failures:
+    sys.exit('\n'.join(failures))
@@ -1,28 +1,246 @@
 import numpy as np
-import scipy.stats as stats
-import matplotlib.pyplot as plt
 
-def bootstrap(x, resamples=10000):
+# Upper bound on the bytes held by one chunk of resamples (index matrix plus the gathered values).
+DEFAULT_MAX_MEMORY = 64 * 2**20
+
+def _chunk_rows(row_bytes, resamples, chunk_size=None, max_memory=DEFAULT_MAX_MEMORY):
+    """Number of resamples to draw per chunk.
+
+    Parameters
+    ----------
+    row_bytes: int
+      Bytes needed to hold a single resample.
+
+    resamples: int
+      The total number of bootstrap samples to draw.
+
+    chunk_size: int or None
+      Explicit number of resamples per chunk, overrides max_memory.
+
+    max_memory: int
+      Upper bound in bytes for a single chunk.
+
+    Returns
+    -------
+    rows: int
+    """
+    if chunk_size is None:
+        chunk_size = max_memory // max(row_bytes, 1)
+    return int(max(1, min(chunk_size, resamples)))
+
+def resample_indices(n_obs, resamples=10000, rng=None, chunk_size=None, max_memory=DEFAULT_MAX_MEMORY):
+    """Draw bootstrap index matrices in chunks of bounded size.
+
+    The indices are drawn row by row from a single stream, so the concatenated
+    chunks are the same whatever the chunk size.
+
+    Parameters
+    ----------
+    n_obs: int
+      The number of observations to resample from.
+
+    resamples: int
+      The number of bootstrap samples to draw, at least 1.
+
+    rng: np.random.Generator, int or None
+      Generator (or seed for one) the indices are drawn from.
+
+    chunk_size: int or None
+      Number of resamples per chunk, derived from max_memory when None.
+
+    max_memory: int
+      Upper bound in bytes for a single index matrix.
+
+    Returns
+    -------
+    chunks: Iterator[np.array], shape (chunk, n_obs)
+      Index matrices, one bootstrap sample per row.
+    """
+    if resamples < 1:
+        raise ValueError(f"resamples must be at least 1, got {resamples}.")
+    rng = np.random.default_rng(rng)
+    row_bytes = n_obs * np.dtype(np.intp).itemsize
+    rows = _chunk_rows(row_bytes, resamples, chunk_size, max_memory)
+    for start in range(0, resamples, rows):
+        yield rng.integers(n_obs, size=(min(rows, resamples - start), n_obs))
+
+def _reduce(samples, statistic):
+    """Reduce resamples of shape (chunk, n_obs, ...) along the observation axis."""
+    if isinstance(statistic, str):
+        if statistic == 'mean':
+            return samples.mean(axis=1)
+        if statistic == 'median':
+            return np.median(samples, axis=1)
+        raise ValueError(f"Unknown statistic '{statistic}', use 'mean', 'median', a ufunc or a callable.")
+    if isinstance(statistic, np.ufunc):
+        return statistic.reduce(samples, axis=1)
+    return statistic(samples, axis=1)
+
+def bootstrap_statistic(x, resamples=10000, statistic='mean', rng=None, chunk_size=None, max_memory=DEFAULT_MAX_MEMORY):
+    """Bootstrap a statistic of the array x without keeping the resamples around.
+
+    Parameters
+    ----------
+    x: np.array, shape (n, ) or (n, k)
+      The data to draw the bootstrap samples from. Rows of a 2-D array are
+      resampled together, so every column shares the same resample indices.
+
+    resamples: int
+      The number of bootstrap samples to draw from x, at least 1.
+
+    statistic: str, np.ufunc or callable
+      'mean', 'median', a ufunc reduced along the sample axis (e.g. np.add,
+      np.maximum) or a callable taking (samples, axis=1).
+
+    rng: np.random.Generator, int or None
+      Generator (or seed for one) the resamples are drawn from.
+
+    chunk_size: int or None
+      Number of resamples reduced at a time, derived from max_memory when None.
+
+    max_memory: int
+      Upper bound in bytes for one chunk of indices and gathered values.
+
+    Returns
+    -------
+    bootstrap_stats: np.array, shape (resamples, ) or (resamples, k)
+      The statistic of each bootstrap sample.
+    """
+    x = np.asarray(x)
+    n_obs = x.shape[0]
+    row_bytes = n_obs * (np.dtype(np.intp).itemsize + x.itemsize * int(np.prod(x.shape[1:])))
+    rows = _chunk_rows(row_bytes, resamples, chunk_size, max_memory)
+    chunks = [_reduce(x[idxs], statistic) for idxs in resample_indices(n_obs, resamples, rng, rows)]
+    return np.concatenate(chunks)
+
+def bootstrap(x, resamples=10000, rng=None, chunk_size=None, max_memory=DEFAULT_MAX_MEMORY):
     """Draw bootstrap resamples from the array x.
 
     Parameters
     ----------
     x: np.array, shape (n, )
       The data to draw the bootstrap samples from.
-    
+
     resamples: int
-      The number of bootstrap samples to draw from x.
-    
+      The number of bootstrap samples to draw from x, an empty list for 0.
+
+    rng: np.random.Generator, int or None
+      Generator (or seed for one) the resamples are drawn from. None draws
+      from the global np.random state, so np.random.seed reproduces the
+      resamples of earlier versions.
+
+    chunk_size: int or None
+      Number of resamples drawn at a time, derived from max_memory when None.
+
+    max_memory: int
+      Upper bound in bytes for a single index matrix.
+
     Returns
     -------
     bootstrap_samples: List[np.array]
-      The bootstrap resamples from x.  
+      The bootstrap resamples from x.
       Each array is a single bootstrap sample.
     """
+    x = np.asarray(x)
     n_obs = x.shape[0]
     boot_samples = []
-    for k in range(resamples):
-        boot_idxs = np.random.randint(n_obs, size=n_obs)
-        boot_sample = x[boot_idxs]
-        boot_samples.append(boot_sample)
-    return boot_samples
\ No newline at end of file
+    if resamples < 1:
+        return boot_samples
+    if rng is None:
+        # a chunk of global randint draws is the same stream as one randint call per resample
+        rows = _chunk_rows(n_obs * np.dtype(np.intp).itemsize, resamples, chunk_size, max_memory)
+        chunks = (np.random.randint(n_obs, size=(min(rows, resamples - start), n_obs)) for start in range(0, resamples, rows))
+    else:
+        chunks = resample_indices(n_obs, resamples, rng, chunk_size, max_memory)
+    for boot_idxs in chunks:
+        boot_samples.extend(x[boot_idxs])
+    return boot_samples
+
+def _exceedance_bounds(exceed, n_permutations, confidence):
+    """Clopper-Pearson interval of the probability that a permutation is at least as extreme as the data."""
+    from scipy import stats
+    tail = (1 - confidence) / 2
+    with np.errstate(invalid='ignore'):
+        lower = np.where(exceed > 0, stats.beta.ppf(tail, exceed, n_permutations - exceed + 1), 0.0)
+        upper = np.where(exceed < n_permutations, stats.beta.ppf(1 - tail, exceed + 1, n_permutations - exceed), 1.0)
+    return lower, upper
+
+def _mean_difference(first_sum, first_count, total, total_count):
+    """Mean of the first group minus mean of the rest from the first group's sums and counts."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return first_sum / first_count - (total - first_sum) / (total_count - first_count)
+
+def permutation_test(x, labels, permutations=10000, alpha=0.05, confidence=0.99, rng=None, chunk_size=None,
+                     max_memory=DEFAULT_MAX_MEMORY):
+    """Two sided permutation test of the difference in means between two groups, for every column of x at once.
+
+    The group labels are shuffled a batch at a time into a matrix of permutations, and the group sums of every
+    column come out of one matrix product with it. After each batch, a column stops once the confidence interval
+    of its permutation p-value lies entirely above or below alpha, so clear results only use a small part of
+    the permutation budget. NaN entries are left out of their column.
+
+    Parameters
+    ----------
+    x: np.array, shape (n, ) or (n, k)
+      The values of both groups, one column per variable.
+
+    labels: np.array of bool, shape (n, )
+      True for the rows of the first group.
+
+    permutations: int
+      The most permutations to draw for a column.
+
+    alpha: float
+      Significance level the p-values are compared against when stopping early, None always draws every permutation.
+
+    confidence: float
+      Confidence of the interval around each p-value that has to exclude alpha before the column stops.
+
+    rng: np.random.Generator, int or None
+      Generator (or seed for one) the permutations are drawn from.
+
+    chunk_size: int or None
+      Number of permutations per batch, a twentieth of the permutations when None, capped by max_memory.
+
+    max_memory: int
+      Upper bound in bytes for one batch of permutations.
+
+    Returns
+    -------
+    statistic: np.array, shape (k, )
+      Mean of the first group minus mean of the second group.
+
+    pvalues: np.array, shape (k, )
+      Permutation p-values, (1 + permutations at least as extreme) / (1 + permutations drawn).
+
+    n_permutations: np.array, shape (k, )
+      The number of permutations each column used.
+    """
+    rng = np.random.default_rng(rng)
+    x = np.asarray(x, dtype=float)
+    if x.ndim == 1:
+        x = x[:, None]
+    labels = np.asarray(labels, dtype=bool)
+    valid = ~np.isnan(x)
+    values = np.where(valid, x, 0.0)
+    counts = valid.astype(float)
+    total, total_count = values.sum(axis=0), counts.sum(axis=0)
+    statistic = _mean_difference(labels @ values, labels @ counts, total, total_count)
+    # permutations tying the observed statistic count as extreme, up to floating point error in the sums
+    threshold = np.abs(statistic) * (1 - 1e-12)
+    exceed, drawn = np.zeros(x.shape[1]), np.zeros(x.shape[1])
+    active = np.flatnonzero(~np.isnan(statistic))
+    rows = _chunk_rows(x.shape[0] * 2 * np.dtype(float).itemsize, permutations, None, max_memory)
+    rows = min(rows, chunk_size or max(permutations // 20, 100))
+    while len(active) and drawn[active[0]] < permutations:
+        batch = int(min(rows, permutations - drawn[active[0]]))
+        shuffled = rng.permuted(np.broadcast_to(labels, (batch, len(labels))), axis=1).astype(float)
+        differences = _mean_difference(shuffled @ values[:, active], shuffled @ counts[:, active], total[active], total_count[active])
+        exceed[active] += (np.abs(differences) >= threshold[active]).sum(axis=0)
+        drawn[active] += batch
+        if alpha is not None:
+            lower, upper = _exceedance_bounds(exceed[active], drawn[active], confidence)
+            active = active[(lower <= alpha) & (upper >= alpha)]
+    with np.errstate(invalid='ignore'):
+        pvalues = np.where(np.isnan(statistic), np.nan, (1 + exceed) / (1 + drawn))
+    return statistic, pvalues, drawn.astype(int)
@@ -0,0 +1,152 @@
+import pandas as pd
+import hashlib
+import json
+import glob
+import os
+import importlib.util
+from web import source_to_df, csv_to_df
+from data import prepare_dfs
+from manifest import load_manifest, save_manifest, csv_hash, record_processed
+from instrument import stage, count_cache
+
+# Bump when the cleaning steps change in a way the parameters below do not capture.
+CACHE_VERSION = 4
+
+# pyarrow is only looked up here, pandas imports it on the first parquet read or write
+CACHE_FORMAT = 'parquet' if importlib.util.find_spec('pyarrow') else 'pkl'
+
+def cache_key(reliever_hash, value_hash, col_names, min_gr_pct, min_gr, typed):
+  '''
+  Returns the key a cleaned season is stored under, built from the source file hashes and the cleaning parameters
+
+  Parameters
+  ----------
+  reliever_hash - str of sha256 of the season's reliever csv
+
+  value_hash - str of sha256 of the season's value csv
+
+  col_names, min_gr_pct, min_gr - cleaning parameters passed to prepare_dfs
+
+  typed - whether the csv files are read with read_typed_csv
+
+  Returns
+  ----------
+  str
+
+  '''
+  params = {'version': CACHE_VERSION, 'reliever': reliever_hash, 'value': value_hash,
+            'col_names': list(col_names), 'min_gr_pct': min_gr_pct, 'min_gr': min_gr, 'typed': typed}
+  return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+def source_key(reliever_hash, value_hash):
+  '''
+  Returns the part of a cached season's file name that changes with its source files, so entries of the season cleaned
+  with other parameters are kept while the csv files stay the same
+
+  Parameters
+  ----------
+  reliever_hash - str of sha256 of the season's reliever csv
+
+  value_hash - str of sha256 of the season's value csv
+
+  Returns
+  ----------
+  str
+
+  '''
+  return hashlib.sha256(f'{CACHE_VERSION}-{reliever_hash}-{value_hash}'.encode()).hexdigest()[:16]
+
+def _read(file):
+  if file.endswith('.parquet'):
+    return pd.read_parquet(file)
+  return pd.read_pickle(file)
+
+def _write(df, file):
+  if file.endswith('.parquet'):
+    df.to_parquet(file)
+  else:
+    df.to_pickle(file)
+
+def clear_cache(cache_dir):
+  '''
+  Removes every cached season from cache_dir
+
+  Parameters
+  ----------
+  cache_dir - str of cache directory
+
+  '''
+  for file in glob.glob(f'{cache_dir}/*-*.parquet') + glob.glob(f'{cache_dir}/*-*.pkl'):
+    os.remove(file)
+
+@stage()
+def load_dfs(start_year, end_year, directory='data', col_names=['RAA','RAR', 'RA9', 'WAA', 'WAR'], min_gr_pct=.50, min_gr=5,
+             cache_dir=None, download=False, typed=True, fetcher=None, workers=2, incremental=False, refresh=()):
+  '''
+  Returns the cleaned season dataframes of main.py, reading them from a columnar cache when the csv files and
+  cleaning parameters are unchanged. Seasons that are missing from the cache or whose csv files changed are
+  parsed and cleaned again and written back, replacing the entries cleaned from the old csv files under any
+  parameters. The csv hashes and the cache file of each season are tracked in the directory's manifest.json,
+  so unchanged csv files are not even re-read for hashing.
+
+  Parameters
+  ----------
+  start_year - int of earliest season e.g. 2015
+
+  end_year - int of last season e.g. 2019
+
+  directory - str of directory holding the scraped csv files
+
+  col_names, min_gr_pct, min_gr - cleaning parameters passed to prepare_dfs
+
+  cache_dir - str of cache directory, defaults to directory/.cache
+
+  download - scrape the csv files first with source_to_df
+
+  fetcher, workers, incremental, refresh - passed to source_to_df when downloading, incremental=True only
+  downloads the seasons without csv files (e.g. adding 2020 to 2015-2019) and the seasons in refresh
+
+  typed - parse the csv files with read_typed_csv, False lets pandas infer every column like source_to_df does by default
+
+  Returns
+  ----------
+  list of cleaned dataframes from the latest season to the earliest, as source_to_df orders them
+
+  '''
+  if download == True:
+    source_to_df(start_year, end_year, directory, download=True, fetcher=fetcher, workers=workers,
+                 incremental=incremental, refresh=refresh)
+  if cache_dir is None:
+    cache_dir = f'{directory}/.cache'
+  os.makedirs(cache_dir, exist_ok=True)
+  manifest = load_manifest(directory)
+  dfs, missing = [], []
+  for year in range(end_year, start_year - 1, -1):
+    reliever_csv, value_csv = f'{directory}/{year}-reliever.csv', f'{directory}/{year}-value.csv'
+    if not (os.path.exists(reliever_csv) and os.path.exists(value_csv)):
+      continue
+    reliever_hash, value_hash = csv_hash(manifest, year, 'reliever', reliever_csv), csv_hash(manifest, year, 'value', value_csv)
+    key = cache_key(reliever_hash, value_hash, col_names, min_gr_pct, min_gr, typed)
+    source = f'{year}-{source_key(reliever_hash, value_hash)}-'
+    cached = f'{cache_dir}/{source}{key[:16]}.{CACHE_FORMAT}'
+    record_processed(manifest, year, key, cached)
+    count_cache('load_dfs', os.path.exists(cached))
+    if os.path.exists(cached):
+      dfs.append(_read(cached))
+      continue
+    # only entries cleaned from other csv files are stale, other parameters of the same csv files stay cached
+    for stale in glob.glob(f'{cache_dir}/{year}-*.*'):
+      if not os.path.basename(stale).startswith(source):
+        os.remove(stale)
+    dfs.append(None)
+    missing.append((len(dfs) - 1, reliever_csv, value_csv, cached))
+  # the seasons missing from the cache are cleaned together, joining all of them in one pass
+  if missing:
+    cleaned = prepare_dfs([csv_to_df(reliever_csv, typed) for idx, reliever_csv, value_csv, cached in missing],
+                          [csv_to_df(value_csv, typed) for idx, reliever_csv, value_csv, cached in missing],
+                          col_names, min_gr_pct, min_gr)
+    for (idx, reliever_csv, value_csv, cached), df in zip(missing, cleaned):
+      _write(df, cached)
+      dfs[idx] = df
+  save_manifest(directory, manifest)
+  return dfs
@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+from bootstrap import resample_indices, _chunk_rows, DEFAULT_MAX_MEMORY
+
+CI_KINDS = ('percentile', 'bca', 'studentized')
+
+def resample_moments(x, resamples=10000, rng=None, studentized=True, chunk_size=None, max_memory=DEFAULT_MAX_MEMORY):
+  '''
+  Bootstraps the means, and standard deviations for studentized intervals, of every column of x from one stream of
+  resample index matrices shared by all columns. The index matrices are the ones bootstrap.bootstrap and
+  bootstrap_statistic draw, so the same rng resamples the same rows.
+
+  Parameters
+  ----------
+  x - np.array of shape (n, ) or (n, k)
+
+  resamples - int of number of bootstrap samples
+
+  rng - np.random.Generator or int seed, default to None
+
+  studentized - also return the standard deviation of every resample
+
+  chunk_size, max_memory - bound the resamples gathered at a time like bootstrap_statistic
+
+  Returns
+  ----------
+  Tuple of np.arrays of shape (resamples, k) of the resample means and standard deviations (None unless studentized)
+
+  '''
+  x = np.asarray(x, dtype=float)
+  if x.ndim == 1:
+    x = x[:, None]
+  n = x.shape[0]
+  row_bytes = n * (np.dtype(np.intp).itemsize + x.itemsize * x.shape[1])
+  rows = _chunk_rows(row_bytes, resamples, chunk_size, max_memory)
+  # each resample's variance is its sum of squares less n times its squared mean, gathered from the data less its
+  # mean so both terms stay small, and the standard deviations need no second pass over the gathered rows
+  shift = x.mean(axis=0)
+  centered = x - shift
+  means, stds = [], []
+  for idxs in resample_indices(n, resamples, rng, rows):
+    samples = centered[idxs]
+    mean = samples.sum(axis=1) / n
+    means.append(mean + shift)
+    if studentized:
+      stds.append(np.sqrt(np.maximum(np.einsum('ijk,ijk->ik', samples, samples) - n * mean**2, 0) / (n - 1)))
+  return np.concatenate(means), (np.concatenate(stds) if studentized else None)
+
+def jackknife_means(x):
+  '''
+  Returns the mean of x without each row, for every row and column at once
+
+  Parameters
+  ----------
+  x - np.array of shape (n, k)
+
+  Returns
+  ----------
+  np.array of shape (n, k)
+
+  '''
+  return (x.sum(axis=0) - x) / (len(x) - 1)
+
+def acceleration(jackknives):
+  '''
+  BCa acceleration of every column from the jackknife values of one or more samples, like scipy.stats.bootstrap
+
+  Parameters
+  ----------
+  jackknives - list of np.arrays of shape (n_j, k) of the statistic with each row of sample j left out
+
+  Returns
+  ----------
+  np.array of shape (k, )
+
+  '''
+  num, den = 0, 0
+  for jackknife in jackknives:
+    n = len(jackknife)
+    u = (n - 1) * (jackknife.mean(axis=0) - jackknife)
+    num = num + (u**3).sum(axis=0) / n**3
+    den = den + (u**2).sum(axis=0) / n**2
+  with np.errstate(invalid='ignore', divide='ignore'):
+    return num / (6 * den**1.5)
+
+def _quantiles(sorted_boot, q):
+  '''
+  Linearly interpolated quantiles of every column of an already sorted bootstrap distribution, q per column
+  '''
+  q = np.broadcast_to(q, sorted_boot.shape[1:])
+  pos = np.clip(np.nan_to_num(q), 0, 1) * (len(sorted_boot) - 1)
+  low = np.floor(pos).astype(int)
+  high = np.minimum(low + 1, len(sorted_boot) - 1)
+  cols = np.arange(sorted_boot.shape[1])
+  return sorted_boot[low, cols] + (pos - low) * (sorted_boot[high, cols] - sorted_boot[low, cols])
+
+def intervals(boot, estimate, confidence=.95, kinds=CI_KINDS, jackknives=None, boot_se=None, se=None):
+  '''
+  Confidence intervals of every column from one bootstrap distribution. The distribution is sorted once and every
+  kind reads its bounds off it, so extra kinds only cost a few vectorized operations.
+
+  Parameters
+  ----------
+  boot - np.array of shape (resamples, k) of bootstrapped statistics
+
+  estimate - np.array of shape (k, ) of the statistic of the data
+
+  confidence - float of confidence level
+
+  kinds - list of 'percentile', 'bca' and 'studentized'
+
+  jackknives - list of jackknife values per sample for 'bca', see acceleration
+
+  boot_se - np.array of shape (resamples, k) of the standard error of each resample for 'studentized'
+
+  se - np.array of shape (k, ) of the standard error of the estimate for 'studentized'
+
+  Returns
+  ----------
+  dict of kind to tuple of np.arrays of the lower and upper bounds
+
+  '''
+  from scipy import stats
+  tail = (1 - confidence) / 2
+  sorted_boot = np.sort(boot, axis=0)
+  result = {}
+  for kind in kinds:
+    if kind == 'percentile':
+      result[kind] = (_quantiles(sorted_boot, tail), _quantiles(sorted_boot, 1 - tail))
+    elif kind == 'bca':
+      # share of resamples below the estimate, ties counting half
+      below = (np.sum(boot < estimate, axis=0) + np.sum(boot <= estimate, axis=0)) / (2 * len(boot))
+      z0 = stats.norm.ppf(below)
+      a = acceleration(jackknives)
+      z = stats.norm.ppf([tail, 1 - tail])
+      with np.errstate(invalid='ignore', divide='ignore'):
+        q = [stats.norm.cdf(z0 + (z0 + z_q) / (1 - a * (z0 + z_q))) for z_q in z]
+      result[kind] = (_quantiles(sorted_boot, q[0]), _quantiles(sorted_boot, q[1]))
+    elif kind == 'studentized':
+      with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.sort((boot - estimate) / boot_se, axis=0)
+      result[kind] = (estimate - _quantiles(t, 1 - tail) * se, estimate - _quantiles(t, tail) * se)
+    else:
+      raise ValueError(f"Unknown interval '{kind}', use 'percentile', 'bca' or 'studentized'.")
+  return result
+
+def group_intervals(hp, lp, resamples=10000, confidence=.95, kinds=CI_KINDS, rng=None, chunk_size=None, max_memory=DEFAULT_MAX_MEMORY):
+  '''
+  Confidence intervals of the means of every column of the higher paid and lower paid groups, and of the difference
+  of their means. Each group is resampled once for every column and kind, the difference reuses both groups' resamples.
+
+  Parameters
+  ----------
+  hp, lp - np.arrays of shape (n, k) of the columns of interest of the higher paid and lower paid groups
+
+  resamples - int of number of bootstrap samples
+
+  confidence - float of confidence level
+
+  kinds - list of 'percentile', 'bca' and 'studentized'
+
+  rng - np.random.Generator or int seed, the higher paid group is resampled first like rp_data.bootstrap
+
+  chunk_size, max_memory - bound the resamples gathered at a time like bootstrap_statistic
+
+  Returns
+  ----------
+  dict of 'hp', 'lp' and 'diff' to tuples of the estimate and the dict of kind to bounds of intervals
+
+  '''
+  rng = np.random.default_rng(rng)
+  hp, lp = np.asarray(hp, dtype=float), np.asarray(lp, dtype=float)
+  studentized = 'studentized' in kinds
+  groups = {}
+  for group, x in (('hp', hp), ('lp', lp)):
+    means, stds = resample_moments(x, resamples, rng, studentized, chunk_size, max_memory)
+    groups[group] = {'boot': means, 'estimate': x.mean(axis=0), 'jackknife': jackknife_means(x), 'n': len(x),
+                     'boot_var': stds**2 / len(x) if studentized else None, 'var': x.var(axis=0, ddof=1) / len(x)}
+  hp_g, lp_g = groups['hp'], groups['lp']
+  # leaving out a higher paid row moves the difference with its mean, leaving out a lower paid row against it
+  diff = {'boot': hp_g['boot'] - lp_g['boot'], 'estimate': hp_g['estimate'] - lp_g['estimate'],
+          'jackknives': [hp_g['jackknife'] - lp_g['estimate'], hp_g['estimate'] - lp_g['jackknife']],
+          'boot_var': hp_g['boot_var'] + lp_g['boot_var'] if studentized else None, 'var': hp_g['var'] + lp_g['var']}
+  for g in (hp_g, lp_g):
+    g['jackknives'] = [g['jackknife']]
+  result = {}
+  for group, g in (('hp', hp_g), ('lp', lp_g), ('diff', diff)):
+    boot_se = np.sqrt(g['boot_var']) if studentized else None
+    result[group] = (g['estimate'], intervals(g['boot'], g['estimate'], confidence, kinds, g['jackknives'], boot_se, np.sqrt(g['var'])))
+  return result
+
+def intervals_df(result, col_names):
+  '''
+  Returns a dataframe of the intervals of group_intervals
+
+  Parameters
+  ----------
+  result - dict returned by group_intervals
+
+  col_names - list of str of column names of the columns of hp and lp
+
+  Returns
+  ----------
+  Dataframe indexed by group, column and kind showing the estimate and the lower and upper bounds
+
+  '''
+  rows = [(group, col_name, kind, estimate[i], lower[i], upper[i])
+          for group, (estimate, bounds) in result.items()
+          for i, col_name in enumerate(col_names)
+          for kind, (lower, upper) in bounds.items()]
+  df = pd.DataFrame(rows, columns=['group', 'col_name', 'kind', 'estimate', 'lower', 'upper'])
+  return df.set_index(['group', 'col_name', 'kind'])
@@ -0,0 +1,294 @@
+import os
+import io
+import sys
+import json
+import time
+import atexit
+import functools
+import contextlib
+import tracemalloc
+import pandas as pd
+
+# RP_INSTRUMENT=1 writes the report of the whole run to stderr at exit, any other value is a json file to write it to.
+# RP_PROFILE is a comma separated list of stages to profile e.g. rp_data.create_df, RP_PROFILER picks cprofile or pyinstrument.
+ENV_VAR = 'RP_INSTRUMENT'
+PROFILE_ENV_VAR = 'RP_PROFILE'
+PROFILER_ENV_VAR = 'RP_PROFILER'
+
+# report of the instrumented block, None when instrumentation is off so every stage only costs this lookup
+_active = None
+
+def _rows(value):
+  '''
+  Rows of a dataframe, of every dataframe in a list, or of the first item of a tuple like (merged, report), None for anything else
+  '''
+  if isinstance(value, (pd.DataFrame, pd.Series)):
+    return len(value)
+  if isinstance(value, tuple) and value:
+    return _rows(value[0])
+  if isinstance(value, list) and value:
+    rows = [_rows(item) for item in value]
+    return None if None in rows else sum(rows)
+  return None
+
+def profile_call(func, *args, profiler='cprofile', limit=30, **kwargs):
+  '''
+  Calls func under cProfile or pyinstrument
+
+  Parameters
+  ----------
+  func - function to profile e.g. data.create_df
+
+  args, kwargs - passed to func
+
+  profiler - 'cprofile' or 'pyinstrument', which has to be installed
+
+  limit - int of functions listed by cProfile, sorted by cumulative time
+
+  Returns
+  ----------
+  Tuple of the result of func and the profiler's text report
+
+  '''
+  if profiler == 'cprofile':
+    import cProfile
+    import pstats
+    prof = cProfile.Profile()
+    result = prof.runcall(func, *args, **kwargs)
+    out = io.StringIO()
+    pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(limit)
+    return result, out.getvalue()
+  if profiler == 'pyinstrument':
+    from pyinstrument import Profiler
+    prof = Profiler()
+    prof.start()
+    try:
+      result = func(*args, **kwargs)
+    finally:
+      prof.stop()
+    return result, prof.output_text()
+  raise ValueError(f"Unknown profiler '{profiler}', use 'cprofile' or 'pyinstrument'.")
+
+class stage_report():
+  def __init__(self, memory=True, profile=(), profiler='cprofile'):
+    '''
+    Collects the time, peak memory and rows in and out of every stage run while it is active, and cache hits and misses
+
+    Parameters
+    ----------
+    memory - trace the peak bytes allocated in each stage with tracemalloc
+
+    profile - list of str of stages to run under profiler, e.g. ['rp_data.create_df']
+
+    profiler - 'cprofile' or 'pyinstrument'
+
+    '''
+    self.memory = memory
+    self.profile = set(profile)
+    self.profiler = profiler
+    self.stages = {}
+    self.caches = {}
+    self.profiles = {}
+    self.started = time.perf_counter()
+    # [bytes traced at the start, highest bytes traced so far] of each running stage, innermost last
+    self._frames = []
+    self._profiling = False
+
+  def run(self, name, func, args, kwargs):
+    '''
+    Runs a stage and adds its time, peak memory and rows to the stage's totals
+    '''
+    stats = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_bytes': 0, 'rows_in': None, 'rows_out': None})
+    rows_in = next((rows for rows in map(_rows, args) if rows is not None), None)
+    if self.memory == True:
+      current, peak = tracemalloc.get_traced_memory()
+      # the enclosing stage keeps its peak so far, tracemalloc only has one peak to reset
+      if self._frames:
+        self._frames[-1][1] = max(self._frames[-1][1], peak)
+      tracemalloc.reset_peak()
+      frame = [current, current]
+      self._frames.append(frame)
+    start = time.perf_counter()
+    try:
+      if name in self.profile and not self._profiling:
+        self._profiling = True
+        try:
+          result, text = profile_call(func, *args, profiler=self.profiler, **kwargs)
+        finally:
+          self._profiling = False
+        self.profiles.setdefault(name, []).append(text)
+      else:
+        result = func(*args, **kwargs)
+    finally:
+      stats['seconds'] += time.perf_counter() - start
+      stats['calls'] += 1
+      if self.memory == True:
+        self._frames.pop()
+        frame[1] = max(frame[1], tracemalloc.get_traced_memory()[1])
+        if self._frames:
+          self._frames[-1][1] = max(self._frames[-1][1], frame[1])
+        stats['peak_bytes'] = max(stats['peak_bytes'], frame[1] - frame[0])
+    rows_out = _rows(result)
+    for key, rows in (('rows_in', rows_in), ('rows_out', rows_out)):
+      if rows is not None:
+        stats[key] = (stats[key] or 0) + rows
+    return result
+
+  def count(self, name, hit):
+    '''
+    Counts a hit or a miss of a cache
+    '''
+    stats = self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+    stats['hits' if hit else 'misses'] += 1
+
+  def to_dict(self):
+    '''
+    Returns the report, stages with rows in and out also show the rows they dropped
+
+    Returns
+    ----------
+    dict of the wall time since the report started, stages, caches with their hit rate, and profiler reports
+
+    '''
+    stages = {}
+    for name, stats in self.stages.items():
+      stages[name] = dict(stats)
+      if stats['rows_in'] is not None and stats['rows_out'] is not None:
+        stages[name]['rows_dropped'] = stats['rows_in'] - stats['rows_out']
+    caches = {name: dict(stats, hit_rate=stats['hits'] / (stats['hits'] + stats['misses'])) for name, stats in self.caches.items()}
+    return {'seconds': time.perf_counter() - self.started, 'memory': self.memory, 'stages': stages, 'caches': caches, 'profiles': self.profiles}
+
+  def to_json(self, file=None):
+    '''
+    Returns the report as json, writing it to file when given
+
+    Parameters
+    ----------
+    file - str of path of json file
+
+    Returns
+    ----------
+    str
+
+    '''
+    text = json.dumps(self.to_dict(), indent=2)
+    if file is not None:
+      with open(file, 'w') as f:
+        f.write(text)
+    return text
+
+def stage(name=None):
+  '''
+  Decorates a function as a stage of the report of the instrument block it runs in. Rows in are counted from the first
+  argument holding dataframes, rows out from the result.
+
+  Parameters
+  ----------
+  name - str of stage name, default to the function's qualified name
+
+  Returns
+  ----------
+  decorator
+
+  '''
+  def decorate(func):
+    label = name or func.__qualname__
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+      if _active is None:
+        return func(*args, **kwargs)
+      return _active.run(label, func, args, kwargs)
+    return wrapper
+  return decorate
+
+def instrument_methods(skip=()):
+  '''
+  Class decorator making every public method a stage named class.method
+
+  Parameters
+  ----------
+  skip - list of str of methods left alone, e.g. small helpers called once per season
+
+  Returns
+  ----------
+  decorator
+
+  '''
+  def decorate(cls):
+    for name, attr in list(vars(cls).items()):
+      if callable(attr) and not name.startswith('_') and name not in skip:
+        setattr(cls, name, stage(f'{cls.__name__}.{name}')(attr))
+    return cls
+  return decorate
+
+def count_cache(name, hit):
+  '''
+  Counts a hit or a miss of a cache in the report of the instrument block, does nothing when instrumentation is off
+
+  Parameters
+  ----------
+  name - str of cache name
+
+  hit - bool
+
+  '''
+  if _active is not None:
+    _active.count(name, hit)
+
+@contextlib.contextmanager
+def instrument(file=None, memory=True, profile=(), profiler='cprofile'):
+  '''
+  Turns instrumentation on for a block, e.g.
+
+    with instrument('report.json') as report:
+      dfs = load_dfs(2015, 2019)
+      rp_data(dfs).create_df(2019, 80, cols)
+
+  Parameters
+  ----------
+  file - str of path of json file the report is written to when the block ends
+
+  memory - trace peak memory with tracemalloc, which slows the traced code down
+
+  profile - list of str of stages to run under profiler, e.g. ['rp_data.create_df']
+
+  profiler - 'cprofile' or 'pyinstrument'
+
+  Returns
+  ----------
+  stage_report
+
+  '''
+  global _active
+  previous = _active
+  report = stage_report(memory, profile, profiler)
+  tracing = memory == True and not tracemalloc.is_tracing()
+  if tracing:
+    tracemalloc.start()
+  _active = report
+  try:
+    yield report
+  finally:
+    _active = previous
+    if tracing:
+      tracemalloc.stop()
+    if file is not None:
+      report.to_json(file)
+
+def _from_environment():
+  '''
+  Instruments the whole run when RP_INSTRUMENT is set
+  '''
+  target = os.environ.get(ENV_VAR)
+  if not target:
+    return
+  profile = [name for name in os.environ.get(PROFILE_ENV_VAR, '').split(',') if name]
+  block = instrument(None if target == '1' else target, profile=profile, profiler=os.environ.get(PROFILER_ENV_VAR, 'cprofile'))
+  report = block.__enter__()
+  def emit():
+    block.__exit__(None, None, None)
+    if target == '1':
+      sys.stderr.write(report.to_json() + '\n')
+  atexit.register(emit)
+
+_from_environment()
@@ -1,28 +1,21 @@
+# selenium, matplotlib and scipy are imported by the functions that use them, so loading the cached data stays fast
 import pandas as pd
 import numpy as np 
-import matplotlib.pyplot as plt
-from scipy import stats
 from web import *
 from bootstrap import *
 from data import *
 from rp_data import *
-
-#source_to_df(start year, end year, directory to save to, download data if needed)
-relievers, salaries = source_to_df(2015, 2019, directory='data', download=False)
-
-dfs = [clean_df(merge_df(r, s)) for r, s in zip(relievers, salaries)]
-
-# removes players who entered the game in relief less than 50% of the time and less than 5 times
-# majority of starter pitchers and position players removed from sample data
-dfs = [exclusion(df) for df in dfs]
+from cache import *
+import plots
 
 col_names = ['RAA','RAR', 'RA9', 'WAA', 'WAR']
 
-for df in dfs:
-    df.reset_index(drop= True)
-    salary_to_int(df)
-    for col_name in col_names:
-        column_to_num(df, col_name)
+#load_dfs(start year, end year, directory to save to, download data if needed)
+#merges, cleans and converts each season like prepare_dfs in data.py, then caches it in directory/.cache
+#so later runs skip the csv parsing until a csv file changes.
+# exclusion removes players who entered the game in relief less than 50% of the time and less than 5 times
+# majority of starter pitchers and position players removed from sample data
+dfs = load_dfs(2015, 2019, directory='data', col_names=col_names, download=False)
 
 data = rp_data(dfs)
 
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import time
+from instrument import count_cache
+
+# Per-season record of the scraped csv files kept next to them in the data directory:
+# {'seasons': {'2019': {'value': {'fetched_at', 'sha256', 'size', 'mtime'}, 'reliever': {...}, 'processed': {'key', 'file'}}}}
+MANIFEST_FILE = 'manifest.json'
+
+def file_hash(file):
+  '''
+  Returns the sha256 hex digest of a file's content
+
+  Parameters
+  ----------
+  file - str of path to file
+
+  Returns
+  ----------
+  str
+
+  '''
+  digest = hashlib.sha256()
+  with open(file, 'rb') as f:
+    for block in iter(lambda: f.read(2**20), b''):
+      digest.update(block)
+  return digest.hexdigest()
+
+def load_manifest(directory):
+  '''
+  Returns the manifest of directory, empty if there is none yet
+
+  Parameters
+  ----------
+  directory - str of directory holding the scraped csv files
+
+  Returns
+  ----------
+  dict
+
+  '''
+  path = os.path.join(directory, MANIFEST_FILE)
+  if not os.path.exists(path):
+    return {'seasons': {}}
+  with open(path) as f:
+    return json.load(f)
+
+def save_manifest(directory, manifest):
+  '''
+  Writes the manifest of directory, replacing the old one in a single step
+
+  Parameters
+  ----------
+  directory - str of directory holding the scraped csv files
+
+  manifest - dict
+
+  '''
+  path = os.path.join(directory, MANIFEST_FILE)
+  with open(path + '.tmp', 'w') as f:
+    json.dump(manifest, f, indent=1, sort_keys=True)
+  os.replace(path + '.tmp', path)
+
+def season_entry(manifest, year):
+  '''
+  Returns the manifest entry of a season, adding an empty one if needed
+  '''
+  return manifest['seasons'].setdefault(str(year), {})
+
+def csv_hash(manifest, year, page, path):
+  '''
+  Returns the sha256 of a season's csv file, only reading the file when its size or modification time
+  differ from the manifest entry, which is updated
+
+  Parameters
+  ----------
+  manifest - dict
+
+  year - int of season
+
+  page - 'value' or 'reliever'
+
+  path - str of path to the csv file
+
+  Returns
+  ----------
+  str
+
+  '''
+  season = season_entry(manifest, year)
+  entry = season.get(page, {})
+  stat = os.stat(path)
+  hit = entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime_ns and 'sha256' in entry
+  count_cache('csv_hash', hit)
+  if hit:
+    return entry['sha256']
+  season[page] = dict(entry, size=stat.st_size, mtime=stat.st_mtime_ns, sha256=file_hash(path))
+  return season[page]['sha256']
+
+def record_fetch(manifest, year, page, path):
+  '''
+  Records the fetch time and content hash of a freshly scraped csv file
+
+  Parameters
+  ----------
+  manifest - dict
+
+  year - int of season
+
+  page - 'value' or 'reliever'
+
+  path - str of path to the written csv file
+
+  '''
+  season_entry(manifest, year)[page] = {'fetched_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+  csv_hash(manifest, year, page, path)
+
+def record_processed(manifest, year, key, file):
+  '''
+  Records which cache file holds the cleaned season for the cache key
+  '''
+  season_entry(manifest, year)['processed'] = {'key': key, 'file': os.path.basename(file)}
+
+def missing_pages(directory, years, pages, refresh=()):
+  '''
+  Returns the (year, page) pairs that need fetching: pages without a csv file, plus every page of the
+  seasons in refresh (e.g. a season still in progress). Past seasons never change so their csv files are kept.
+
+  Parameters
+  ----------
+  directory - str of directory holding the scraped csv files
+
+  years - list of int of seasons
+
+  pages - list of page types e.g. ['value', 'reliever']
+
+  refresh - list of int of seasons to fetch again regardless
+
+  Returns
+  ----------
+  list of tuples
+
+  '''
+  refresh = {int(year) for year in refresh}
+  return [(year, page) for year in years for page in pages
+          if int(year) in refresh or not os.path.exists(f'{directory}/{year}-{page}.csv')]
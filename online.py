@@ -0,0 +1,306 @@
+import numpy as np
+import pandas as pd
+from web import source_to_df
+from data import clean_stream
+
+class accumulator():
+  def __init__(self, n_cols):
+    '''
+    Mergeable moments of every column of interest and of Salary for one group of players: the count, means,
+    sums of squared deviations from the mean (M2) and the co-moment of each column with Salary. Rows where a column
+    or Salary is NaN are left out of that column. Accumulators of seasons, chunks or processes combine with +,
+    giving the moments of all their rows, so t-tests and correlations never need the rows themselves.
+
+    Parameters
+    ----------
+    n_cols - int of number of columns
+
+    '''
+    self.count = np.zeros(n_cols)
+    self.mean = np.zeros(n_cols)
+    self.m2 = np.zeros(n_cols)
+    self.salary_mean = np.zeros(n_cols)
+    self.salary_m2 = np.zeros(n_cols)
+    self.comoment = np.zeros(n_cols)
+
+  def _combine(self, other):
+    '''
+    Folds the moments of other into these with the pairwise update of Chan et al.
+    '''
+    total = self.count + other.count
+    with np.errstate(invalid='ignore', divide='ignore'):
+      weight = np.where(total > 0, other.count / total, 0.0)
+    cross = self.count * weight # n_a * n_b / n
+    delta, salary_delta = other.mean - self.mean, other.salary_mean - self.salary_mean
+    self.m2 = self.m2 + other.m2 + delta**2 * cross
+    self.salary_m2 = self.salary_m2 + other.salary_m2 + salary_delta**2 * cross
+    self.comoment = self.comoment + other.comoment + delta * salary_delta * cross
+    self.mean = self.mean + delta * weight
+    self.salary_mean = self.salary_mean + salary_delta * weight
+    self.count = total
+
+  def update(self, values, salary):
+    '''
+    Adds a chunk of rows
+
+    Parameters
+    ----------
+    values - np.array of shape (rows, n_cols)
+
+    salary - np.array of shape (rows, ) of the salaries of the rows
+
+    '''
+    self._combine(accumulate(values, salary))
+
+  def __add__(self, other):
+    total = accumulator(len(self.count))
+    total._combine(self)
+    total._combine(other)
+    return total
+
+  def __radd__(self, other):
+    # lets sum() start from 0
+    if isinstance(other, int) and other == 0:
+      return self
+    return self + other
+
+  def var(self, ddof=1):
+    '''
+    Returns the variance of every column
+    '''
+    with np.errstate(invalid='ignore', divide='ignore'):
+      return self.m2 / (self.count - ddof)
+
+  def std(self, ddof=1):
+    '''
+    Returns the standard deviation of every column
+    '''
+    return np.sqrt(self.var(ddof))
+
+def accumulate(values, salary):
+  '''
+  Returns the accumulator of a batch of rows
+
+  Parameters
+  ----------
+  values - np.array of shape (rows, n_cols), or (rows, ) for a single column
+
+  salary - np.array of shape (rows, ) of the salaries of the rows
+
+  Returns
+  ----------
+  accumulator
+
+  '''
+  values = np.asarray(values, dtype=float)
+  if values.ndim == 1:
+    values = values[:, None]
+  salary = np.broadcast_to(np.asarray(salary, dtype=float)[:, None], values.shape)
+  valid = ~(np.isnan(values) | np.isnan(salary))
+  acc = accumulator(values.shape[1])
+  acc.count = valid.sum(axis=0).astype(float)
+  with np.errstate(invalid='ignore', divide='ignore'):
+    acc.mean = np.where(acc.count > 0, np.where(valid, values, 0).sum(axis=0) / acc.count, 0.0)
+    acc.salary_mean = np.where(acc.count > 0, np.where(valid, salary, 0).sum(axis=0) / acc.count, 0.0)
+  deviations = np.where(valid, values - acc.mean, 0)
+  salary_deviations = np.where(valid, salary - acc.salary_mean, 0)
+  acc.m2 = (deviations**2).sum(axis=0)
+  acc.salary_m2 = (salary_deviations**2).sum(axis=0)
+  acc.comoment = (deviations * salary_deviations).sum(axis=0)
+  return acc
+
+def ttest(hp, lp, equal_var=True):
+  '''
+  Two sided t-test of every column between two groups from their accumulators, like scipy.stats.ttest_ind
+
+  Parameters
+  ----------
+  hp, lp - accumulators of the higher paid and lower paid groups
+
+  equal_var - True for student's t-test, False for welch's
+
+  Returns
+  ----------
+  Tuple of np.arrays of the t statistics and pvalues
+
+  '''
+  from scipy import stats
+  n1, n2 = hp.count, lp.count
+  v1, v2 = hp.var(), lp.var()
+  with np.errstate(invalid='ignore', divide='ignore'):
+    if equal_var:
+      dof = n1 + n2 - 2
+      denom = np.sqrt(((n1 - 1) * v1 + (n2 - 1) * v2) / dof * (1 / n1 + 1 / n2))
+    else:
+      vn1, vn2 = v1 / n1, v2 / n2
+      dof = (vn1 + vn2)**2 / (vn1**2 / (n1 - 1) + vn2**2 / (n2 - 1))
+      denom = np.sqrt(vn1 + vn2)
+    t_stats = (hp.mean - lp.mean) / denom
+  return t_stats, 2 * stats.t.sf(np.abs(t_stats), dof)
+
+def pearson(acc):
+  '''
+  Pearson correlation coefficient of Salary with every column and its two sided pvalue, like scipy.stats.pearsonr
+
+  Parameters
+  ----------
+  acc - accumulator of a group
+
+  Returns
+  ----------
+  Tuple of np.arrays of the correlation coefficients and pvalues
+
+  '''
+  from scipy import stats
+  dof = acc.count - 2
+  with np.errstate(invalid='ignore', divide='ignore'):
+    r = np.clip(acc.comoment / np.sqrt(acc.m2 * acc.salary_m2), -1, 1)
+    t_stats = r * np.sqrt(dof / ((1 - r) * (1 + r)))
+  return r, 2 * stats.t.sf(np.abs(t_stats), dof)
+
+class reservoir():
+  def __init__(self, size, n_cols, rng=None):
+    '''
+    Uniform random sample of at most size rows out of every row seen, updated a chunk at a time.
+    Every row gets a random key and the rows with the smallest keys are kept, so reservoirs fed
+    from different chunks or processes can be merged.
+
+    Parameters
+    ----------
+    size - int of rows to keep
+
+    n_cols - int of number of columns
+
+    rng - np.random.Generator or int seed, default to None
+
+    '''
+    self.size = size
+    self.rng = np.random.default_rng(rng)
+    self.keys = np.empty(0)
+    self.sample = np.empty((0, n_cols))
+
+  def _keep(self, keys, rows):
+    keys, rows = np.concatenate([self.keys, keys]), np.concatenate([self.sample, rows])
+    if len(keys) > self.size:
+      kept = np.argpartition(keys, self.size - 1)[:self.size]
+      keys, rows = keys[kept], rows[kept]
+    self.keys, self.sample = keys, rows
+
+  def update(self, values):
+    '''
+    Offers a chunk of rows to the sample
+
+    Parameters
+    ----------
+    values - np.array of shape (rows, n_cols)
+
+    '''
+    values = np.asarray(values, dtype=float)
+    self._keep(self.rng.random(len(values)), values)
+
+  def merge(self, other):
+    '''
+    Keeps a uniform sample of the rows seen by this and another reservoir of the same size
+    '''
+    self._keep(other.keys, other.sample)
+
+def season_stream(start_year, end_year, directory='data', col_names=['RAA','RAR', 'RA9', 'WAA', 'WAR'], min_gr_pct=.50, min_gr=5,
+                  chunksize=None):
+  '''
+  Returns the cleaned seasons from the latest to the earliest as a stream of dataframes, chunksize reliever rows at a time
+
+  Parameters
+  ----------
+  start_year - int of earliest season e.g. 2015
+
+  end_year - int of last season e.g. 2019
+
+  directory - str of directory holding the scraped csv files
+
+  col_names, min_gr_pct, min_gr - cleaning parameters passed to clean_stream
+
+  chunksize - int of reliever rows per chunk, None streams whole seasons
+
+  Returns
+  ----------
+  iterator of cleaned dataframes
+
+  '''
+  return clean_stream(source_to_df(start_year, end_year, directory, stream=True, chunksize=chunksize), col_names, min_gr_pct, min_gr)
+
+def stream_stats(start_year, end_year, percentile, col_names, directory='data', min_gr_pct=.50, min_gr=5, chunksize=10000,
+                 reservoir_size=1000, seed=None):
+  '''
+  Builds the accumulator and a reservoir sample of every column of interest for the higher paid and lower paid groups
+  of each season while streaming the csv files, so the cleaned seasons are never all held at once. Memory still grows
+  with the data: a first pass keeps every cleaned salary of every season to find the exact cut-offs, which split the
+  groups like rp_data.split, and each chunk is joined against its season's whole value table. Every csv file is read
+  and cleaned twice, so this is several times slower than load_dfs and rp_data when the seasons fit in memory.
+
+  Parameters
+  ----------
+  start_year - int of earliest season e.g. 2015
+
+  end_year - int of last season e.g. 2019
+
+  percentile - int of percentile to split each season by
+
+  col_names - list of str of column names of interest
+
+  directory - str of directory holding the scraped csv files
+
+  min_gr_pct, min_gr - thresholds passed to exclusion
+
+  chunksize - int of reliever rows per chunk
+
+  reservoir_size - int of rows kept per group to bootstrap from, e.g. bootstrap_statistic(groups[('2019', 'hp')][1].sample)
+
+  seed - int seed of the reservoir samples, default to None
+
+  Returns
+  ----------
+  dict of (year, group) to tuples of accumulator and reservoir, year 'all' holding every season merged
+
+  '''
+  stream = lambda: season_stream(start_year, end_year, directory, col_names, min_gr_pct, min_gr, chunksize)
+  salaries = {}
+  for df in stream():
+    salaries.setdefault(df.file_year_x.iloc[0], []).append(df.Salary.to_numpy())
+  cut_offs = {year: np.percentile(np.concatenate(salary), percentile) for year, salary in salaries.items()}
+  seeds = iter(np.random.SeedSequence(seed).spawn(2 * len(cut_offs) + 2))
+  groups = {(year, group): (accumulator(len(col_names)), reservoir(reservoir_size, len(col_names), next(seeds)))
+            for year in list(cut_offs) + ['all'] for group in ('hp', 'lp')}
+  for df in stream():
+    year = df.file_year_x.iloc[0]
+    values, salary = df[list(col_names)].to_numpy(dtype=float), df.Salary.to_numpy(dtype=float)
+    higher = salary >= cut_offs[year]
+    for group, rows in (('hp', higher), ('lp', ~higher)):
+      acc, sample = groups[(year, group)]
+      acc.update(values[rows], salary[rows])
+      sample.update(values[rows])
+  for year in cut_offs:
+    for group in ('hp', 'lp'):
+      groups[('all', group)] = (groups[('all', group)][0] + groups[(year, group)][0], groups[('all', group)][1])
+      groups[('all', group)][1].merge(groups[(year, group)][1])
+  return groups
+
+def stats_df(groups, col_names):
+  '''
+  Returns a dataframe of the counts, means and variances of stream_stats
+
+  Parameters
+  ----------
+  groups - dict returned by stream_stats
+
+  col_names - list of str of column names passed to stream_stats
+
+  Returns
+  ----------
+  Dataframe indexed by year, group and column
+
+  '''
+  keys = list(groups)
+  index = pd.MultiIndex.from_tuples([key + (col_name,) for key in keys for col_name in col_names], names=['year', 'group', 'col_name'])
+  return pd.DataFrame({'count': np.concatenate([groups[key][0].count for key in keys]),
+                       'mean': np.concatenate([groups[key][0].mean for key in keys]),
+                       'var': np.concatenate([groups[key][0].var() for key in keys])}, index=index)
@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+from players import normalize_names
+
+# Columns summed over a pitcher's seasons, rates like RA9 and SV% do not add up
+PANEL_COLUMNS = ['G', 'GR', 'RAA', 'RAR', 'WAA', 'WAR', 'Salary']
+
+class player_panel():
+  def __init__(self, dfs=(), col_names=PANEL_COLUMNS, season_col='file_year_x'):
+    '''
+    Indexes pitchers across seasons. A pitcher is keyed by normalized name and birth year (season less Age), the birth
+    year may be a year off between seasons as Age is taken on a fixed date. When namesakes could both be the pitcher, the one
+    who last pitched for the same team is taken. Seasons are added in chronological order and can be added later with add_season.
+
+    Parameters
+    ----------
+    dfs - list of cleaned dataframes, one per season, in any order e.g. rp_data.dfs
+
+    col_names - list of str of columns summed over each pitcher's seasons
+
+    season_col - str of the column holding the season
+
+    '''
+    self.col_names = list(col_names)
+    self.season_col = season_col
+    self.seasons = []
+    self.years = {}
+    # name to name id, name id to its pitchers and name id with birth year to its pitchers
+    self.name_ids = {}
+    self.named = {}
+    self.keys = {}
+    self.rows = []
+    self.n_players = 0
+    self.players = {'Name': np.empty(0, dtype=object), 'birth': np.empty(0, dtype=np.int64), 'Tm': np.empty(0, dtype=object),
+                    'first': np.empty(0, dtype=np.int64), 'last': np.empty(0, dtype=np.int64), 'seasons': np.empty(0, dtype=np.int64)}
+    self.totals = np.zeros((0, len(self.col_names)))
+    for df in sorted(dfs, key=lambda df: int(df[season_col].iloc[0])):
+      self.add_season(df)
+
+  def __len__(self):
+    '''
+    Number of pitchers in the panel
+
+    '''
+    return self.n_players
+
+  def _grow(self, n_players):
+    '''
+    Makes room for n_players, doubling the pitcher arrays so adding seasons stays linear
+    '''
+    if n_players <= len(self.totals):
+      return
+    size = max(n_players, 2 * len(self.totals))
+    self.totals = np.concatenate([self.totals, np.zeros((size - len(self.totals), len(self.col_names)))])
+    for key, array in self.players.items():
+      self.players[key] = np.concatenate([array, np.zeros(size - len(array), dtype=array.dtype)])
+
+  def _pick(self, candidates, birth, teams):
+    '''
+    Returns the pitcher a season's rows belong to out of namesakes that could all be the pitcher
+    '''
+    players = self.players
+    # a namesake from the same team is more likely the same pitcher, then the closest birth year, then the latest seen
+    return max(candidates, key=lambda pid: (players['Tm'][pid] in teams, -abs(players['birth'][pid] - birth), players['last'][pid]))
+
+  def add_season(self, df):
+    '''
+    Adds a season to the panel, only its rows are matched to the pitchers already indexed
+
+    Parameters
+    ----------
+    df - cleaned dataframe of one season
+
+    Returns
+    ----------
+    np.array of the pitcher of each row of df
+
+    '''
+    year = df[self.season_col].iloc[0]
+    if str(year) in self.years:
+      raise ValueError(f'Season {year} is already in the panel.')
+    codes, uniques = pd.factorize(df['Name'])
+    names = normalize_names(uniques).to_numpy()
+    name_ids = np.array([self.name_ids.setdefault(name, len(self.name_ids)) for name in names], dtype=np.int64)
+    births = int(year) - df['Age'].to_numpy(dtype=np.int64)
+    teams = df['Tm'].astype(str).to_numpy()
+    # rows of the same name and birth year are the stints of a traded pitcher
+    group, group_keys = pd.factorize(name_ids[codes] * 10000 + births)
+    order = np.argsort(group, kind='stable')
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(group, minlength=len(group_keys)))])
+    first_rows, last_rows = order[bounds[:-1]], order[bounds[1:] - 1]
+
+    group_pids = np.full(len(group_keys), -1)
+    claimed = set()
+    unmatched = range(len(group_keys))
+    keys = group_keys.tolist()
+    # exact birth years are matched first so a namesake a year apart does not take the pitcher
+    for offsets in ((0,), (-1, 1)):
+      pending, unmatched = unmatched, []
+      for g in pending:
+        candidates = [pid for offset in offsets for pid in self.keys.get(keys[g] + offset, ()) if pid not in claimed]
+        if not candidates:
+          unmatched.append(g)
+          continue
+        pid = candidates[0] if len(candidates) == 1 else self._pick(candidates, births[first_rows[g]], set(teams[order[bounds[g]:bounds[g + 1]]]))
+        claimed.add(pid)
+        group_pids[g] = pid
+
+    new = np.array(unmatched, dtype=np.int64)
+    new_pids = np.arange(self.n_players, self.n_players + len(new))
+    group_pids[new] = new_pids
+    self._grow(self.n_players + len(new))
+    self.n_players += len(new)
+    players = self.players
+    players['Name'][new_pids] = names[codes[first_rows[new]]]
+    players['birth'][new_pids] = births[first_rows[new]]
+    players['first'][new_pids] = int(year)
+    for key, pid in zip(group_keys[new].tolist(), new_pids.tolist()):
+      self.keys.setdefault(key, []).append(pid)
+      self.named.setdefault(key // 10000, []).append(pid)
+    self.rows.extend([] for pid in new_pids)
+
+    idx = len(self.seasons)
+    players['Tm'][group_pids] = teams[last_rows]
+    players['last'][group_pids] = int(year)
+    players['seasons'][group_pids] += 1
+    for pid, start, stop in zip(group_pids.tolist(), bounds[:-1].tolist(), bounds[1:].tolist()):
+      self.rows[pid].append((idx, start, stop))
+    pids = group_pids[group]
+    values = np.nan_to_num(df[self.col_names].to_numpy(dtype=float))
+    np.add.at(self.totals, pids, values)
+    self.seasons.append((df.assign(player=pids), pids, values, order))
+    self.years[str(year)] = idx
+    return pids
+
+  def player(self, name):
+    '''
+    Returns every season of the pitchers of a name, found from the name index without scanning the seasons
+
+    Parameters
+    ----------
+    name - str of pitcher name, decorations like * are ignored
+
+    Returns
+    ----------
+    Dataframe of the pitchers' rows with a player column telling namesakes apart
+
+    '''
+    pids = self.named.get(self.name_ids.get(normalize_names([name])[0]))
+    if not pids:
+      raise KeyError(f'No pitcher named {name} in the panel.')
+    return pd.concat([self.seasons[idx][0].iloc[self.seasons[idx][3][start:stop]] for pid in pids for idx, start, stop in self.rows[pid]])
+
+  def aggregates(self, years=None):
+    '''
+    Sums col_names over each pitcher's seasons
+
+    Parameters
+    ----------
+    years - list of int of seasons to sum over, default to every season added so far
+
+    Returns
+    ----------
+    Dataframe indexed by player showing the name, birth year, last team, first and last season, number of seasons and the sums
+
+    '''
+    n = self.n_players
+    players = {key: array[:n] for key, array in self.players.items()}
+    if years is None:
+      totals, first, last, seasons = self.totals[:n], players['first'], players['last'], players['seasons']
+    else:
+      totals = np.zeros((n, len(self.col_names)))
+      first, last, seasons = np.full(n, np.iinfo(np.int64).max), np.full(n, -1), np.zeros(n, dtype=np.int64)
+      for idx in [self.years[str(year)] for year in years if str(year) in self.years]:
+        df, pids, values, order = self.seasons[idx]
+        year = int(df[self.season_col].iloc[0])
+        np.add.at(totals, pids, values)
+        unique = np.unique(pids)
+        seasons[unique] += 1
+        first[unique] = np.minimum(first[unique], year)
+        last[unique] = np.maximum(last[unique], year)
+    df = pd.DataFrame({'Name': players['Name'], 'birth': players['birth'], 'Tm': players['Tm'], 'first': first, 'last': last,
+                       'seasons': seasons}, index=pd.RangeIndex(n, name='player'))
+    df[self.col_names] = totals
+    return df[df['seasons'] > 0]
+
+  def top_value(self, k=10, col_name='WAR', years=None, min_seasons=1):
+    '''
+    Ranks the pitchers by col_name per $1M of salary over their seasons. Only the k best are sorted, picked from
+    every pitcher with a partial sort.
+
+    Parameters
+    ----------
+    k - int of number of pitchers
+
+    col_name - str of column summed in col_names
+
+    years - list of int of seasons to rank over, default to every season added so far
+
+    min_seasons - int of fewest seasons a pitcher needs to be ranked
+
+    Returns
+    ----------
+    Dataframe of the aggregates of the k pitchers with the most col_name per $1M, best first
+
+    '''
+    if k < 0:
+      raise ValueError(f'k must be at least 0, got {k}.')
+    df = self.aggregates(years)
+    df = df[df['seasons'] >= min_seasons]
+    salary = df['Salary'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+      value = np.where(salary > 0, df[col_name].to_numpy() / salary * 1e6, -np.inf)
+    k = min(k, len(df))
+    if k == 0:
+      return df.iloc[:0].assign(**{f'{col_name}_per_1M': value[:0]})
+    top = np.argpartition(-value, k - 1)[:k]
+    top = top[np.argsort(-value[top], kind='stable')]
+    return df.iloc[top].assign(**{f'{col_name}_per_1M': value[top]})
@@ -0,0 +1,128 @@
+import pandas as pd
+import numpy as np
+from instrument import stage
+
+# Decorations baseball-reference appends to names: * left handed, # switch hitter, + hall of fame
+NAME_DECORATIONS = '[*#+]'
+
+# Columns of each table carried through the join, everything else in the scraped tables is left behind
+RELIEVER_COLUMNS = ['G', 'GR', 'SV%', 'IS%', 'file_year']
+VALUE_COLUMNS = ['RA9', 'RAA', 'RAR', 'WAA', 'WAR', 'Salary', 'file_year']
+KEY_COLUMNS = ['Name', 'Age', 'Tm', 'file_year']
+
+def normalize_names(names):
+  '''
+  Strips the decorations and surrounding whitespace from player names, and folds runs of whitespace, the non-breaking
+  spaces baseball-reference separates names with included, into single spaces
+
+  Parameters
+  ----------
+  names - array-like of str e.g. ['Fernando Abad*', 'Bryan Abreu']
+
+  Returns
+  ----------
+  Series of str
+
+  '''
+  return pd.Series(names, dtype=object).str.replace(NAME_DECORATIONS, '', regex=True).str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def _name_codes(names):
+  '''
+  Factorizes names, normalizing each distinct name only once
+  '''
+  codes, uniques = pd.factorize(names)
+  normalized, _ = pd.factorize(normalize_names(uniques))
+  return np.where(codes >= 0, normalized[codes], -1)
+
+def player_keys(left, right, on=KEY_COLUMNS):
+  '''
+  Encodes the key columns of two dataframes into one int64 player key per row, equal keys in both frames
+  meaning the same player, season and team. Names are normalized first so decorations do not have to match.
+
+  Parameters
+  ----------
+  left, right - dataframes holding the columns in on
+
+  on - list of str of key columns, Name is normalized
+
+  Returns
+  ----------
+  tuple of np.array of int64 keys of left and right
+
+  '''
+  keys = np.zeros(len(left) + len(right), dtype=np.int64)
+  for col in on:
+    values = pd.concat([left[col], right[col]], ignore_index=True)
+    codes = _name_codes(values) if col == 'Name' else pd.factorize(values)[0]
+    # combine with the codes so far and factorize again so the keys stay dense however many columns there are
+    keys = pd.factorize(keys * (codes.max(initial=-1) + 2) + codes + 1)[0]
+  return keys[:len(left)], keys[len(left):]
+
+def _match(left_keys, right_keys):
+  '''
+  Returns the row positions of every left and right pair with equal keys, in the order of the left rows
+  '''
+  index = pd.Index(right_keys)
+  if index.is_unique:
+    right_pos = index.get_indexer(left_keys)
+    left_pos = np.flatnonzero(right_pos >= 0)
+    return left_pos, right_pos[left_pos]
+  # a key repeated on the right pairs each left row with all of them, like an inner merge
+  order = np.argsort(right_keys, kind='stable')
+  sorted_keys = right_keys[order]
+  lo = np.searchsorted(sorted_keys, left_keys, 'left')
+  counts = np.searchsorted(sorted_keys, left_keys, 'right') - lo
+  left_pos = np.repeat(np.arange(len(left_keys)), counts)
+  starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+  return left_pos, order[starts + np.arange(len(left_pos))]
+
+@stage()
+def join_players(relievers, values, reliever_columns=RELIEVER_COLUMNS, value_columns=VALUE_COLUMNS):
+  '''
+  Inner joins reliever and value tables on the player key of Name, Age, Tm and file_year (when both tables have it),
+  so any number of seasons is joined in one pass. Only the key columns and the carried columns are kept, those found in
+  both tables are suffixed _x and _y like pd.merge does, e.g. G_x, file_year_x and file_year_y. The header rows
+  baseball-reference repeats inside its tables are dropped first.
+
+  Parameters
+  ----------
+  relievers - reliever dataframe of one or more seasons
+
+  values - value dataframe of the same seasons
+
+  reliever_columns, value_columns - list of str of columns to carry from each table
+
+  Returns
+  ----------
+  joined dataframe indexed like the matching reliever rows,
+  dataframe of matched, reliever_only and value_only row counts per season
+
+  '''
+  relievers = relievers[relievers['Name'] != 'Name']
+  values = values[values['Name'] != 'Name']
+  on = [col for col in KEY_COLUMNS if col in relievers and col in values]
+  left_keys, right_keys = player_keys(relievers, values, on)
+  left_pos, right_pos = _match(left_keys, right_keys)
+
+  key_cols = [col for col in on if col not in reliever_columns]
+  left_cols = key_cols + [col for col in reliever_columns if col in relievers]
+  right_cols = [col for col in value_columns if col in values]
+  both = set(relievers.columns) & set(values.columns)
+  left = relievers[left_cols].iloc[left_pos]
+  right = values[right_cols].iloc[right_pos].set_axis(left.index)
+  merged = pd.concat([left.rename(columns={col: col + '_x' for col in left_cols if col in both and col not in key_cols}),
+                      right.rename(columns={col: col + '_y' for col in right_cols if col in both})], axis=1)
+
+  if 'file_year' in on:
+    left_season, right_season = relievers['file_year'], values['file_year']
+  else:
+    left_season, right_season = pd.Series('all', index=relievers.index), pd.Series('all', index=values.index)
+  matched_left = np.zeros(len(relievers), dtype=bool)
+  matched_left[left_pos] = True
+  matched_right = np.zeros(len(values), dtype=bool)
+  matched_right[right_pos] = True
+  report = pd.DataFrame({'matched': left_season[matched_left].value_counts(sort=False),
+                         'reliever_only': left_season[~matched_left].value_counts(sort=False),
+                         'value_only': right_season[~matched_right].value_counts(sort=False)})
+  report = report.fillna(0).astype(int).rename_axis('season')
+  return merged, report
@@ -0,0 +1,163 @@
+import numpy as np
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# Renders go straight to Agg figures owned by this module rather than through pyplot,
+# so nothing is registered with a gui backend and batch jobs never block or leak figures.
+# matplotlib itself is only imported once something is rendered.
+
+class BootstrapResult(namedtuple('BootstrapResult', ['name', 'title', 'col_name', 'hp_means', 'lp_means',
+                                                     'lower_ci_hp', 'upper_ci_hp', 'lower_ci_lp', 'upper_ci_lp', 'hp_bs_mean', 'lp_bs_mean'])):
+  '''
+  Bootstrapped sample means of the higher paid and lower paid groups with their 95% CIs and means
+  '''
+  def __repr__(self):
+    return (f'BootstrapResult({self.name}: higher paid {self.hp_bs_mean} [{self.lower_ci_hp}, {self.upper_ci_hp}], '
+            f'lower paid {self.lp_bs_mean} [{self.lower_ci_lp}, {self.upper_ci_lp}])')
+
+class ScatterResult(namedtuple('ScatterResult', ['name', 'title', 'col_name', 'hp_salary', 'hp_values', 'lp_salary', 'lp_values'])):
+  '''
+  Salary and column of interest of the higher paid and lower paid groups
+  '''
+  def __repr__(self):
+    return f'ScatterResult({self.name}: {len(self.hp_salary)} higher paid, {len(self.lp_salary)} lower paid)'
+
+def bootstrap_result(name, title, col_name, hp_means, lp_means):
+  '''
+  Summarizes the bootstrapped sample means of both groups
+
+  Parameters
+  ----------
+  name - str used as the file name when rendered
+
+  title - str of plot title
+
+  col_name - str of column name of interest
+
+  hp_means, lp_means - np.array of bootstrapped sample means of the higher paid and lower paid groups
+
+  Returns
+  ----------
+  BootstrapResult
+
+  '''
+  lower_ci_hp, upper_ci_hp = np.percentile(hp_means, [2.5, 97.5])
+  lower_ci_lp, upper_ci_lp = np.percentile(lp_means, [2.5, 97.5])
+  return BootstrapResult(name, title, col_name, hp_means, lp_means, lower_ci_hp, upper_ci_hp, lower_ci_lp, upper_ci_lp,
+                         np.mean(hp_means), np.mean(lp_means))
+
+def draw_bootstrap(ax, result):
+  '''
+  Draws the histogram of a BootstrapResult with its 95% CIs and means on ax
+  '''
+  ax.hist(result.hp_means, alpha=0.5, bins=20, histtype='stepfilled', label='Higher Paid')
+  ax.hist(result.lp_means, alpha=0.5, bins=20, histtype='stepfilled', label ='Lower Paid')
+  ax.axvline(result.lower_ci_hp, color='blue', linestyle="--", alpha=0.5, label='Higher Paid 95% CI')
+  ax.axvline(result.upper_ci_hp, color='blue', linestyle="--", alpha=0.5)
+  ax.axvline(result.lower_ci_lp, color='red', linestyle="--", alpha=0.5, label='Lower Paid 95% CI')
+  ax.axvline(result.upper_ci_lp, color='red', linestyle="--", alpha=0.5)
+  ax.axvline(result.hp_bs_mean, color='green', linestyle="--", alpha=0.5, label='Higher Paid Mean')
+  ax.axvline(result.lp_bs_mean, color='black', linestyle="--", alpha=0.5, label='Lower Paid Mean')
+  ax.legend()
+  ax.set_xlabel(f'{result.col_name} means')
+  ax.set_ylabel('Count')
+  ax.set_title(result.title)
+
+def draw_scatter(ax, result):
+  '''
+  Draws the salary vs column of interest scatter plot of a ScatterResult on ax
+  '''
+  ax.scatter(result.hp_salary, result.hp_values, alpha =0.5, label='hp')
+  ax.scatter(result.lp_salary, result.lp_values, alpha=0.5, label='lp')
+  ax.set_title(result.title)
+  ax.set_xlabel('Salary')
+  ax.set_ylabel(f'{result.col_name}')
+  ax.legend()
+
+DRAW = {BootstrapResult: (draw_bootstrap, (12, 4)), ScatterResult: (draw_scatter, (6.4, 4.8))}
+
+def _render_batch(args):
+  '''
+  Renders a list of results to files, reusing one Agg figure per figure size
+  '''
+  from matplotlib.figure import Figure
+  from matplotlib.backends.backend_agg import FigureCanvasAgg
+  results, paths, dpi = args
+  figures = {}
+  for result, path in zip(results, paths):
+    draw, figsize = DRAW[type(result)]
+    if figsize not in figures:
+      figures[figsize] = Figure(figsize=figsize)
+      FigureCanvasAgg(figures[figsize])
+    fig = figures[figsize]
+    fig.clear()
+    draw(fig.add_subplot(), result)
+    fig.savefig(path, dpi=dpi)
+
+def render(results, directory, fmt='png', workers=1, dpi=100):
+  '''
+  Writes the figures of BootstrapResults and ScatterResults to directory without a display
+
+  Parameters
+  ----------
+  results - list of BootstrapResult or ScatterResult
+
+  directory - str of directory to write to, created if needed
+
+  fmt - str of image format e.g. 'png' or 'svg'
+
+  workers - int of processes to render on, 1 renders in this process and None uses every cpu
+
+  dpi - int of resolution
+
+  Returns
+  ----------
+  list of str of written file paths, in the order of results
+
+  '''
+  os.makedirs(directory, exist_ok=True)
+  paths = [os.path.join(directory, f'{result.name}.{fmt}') for result in results]
+  workers = workers or os.cpu_count()
+  if workers == 1:
+    _render_batch((results, paths, dpi))
+  else:
+    batches = [(results[i::workers], paths[i::workers], dpi) for i in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+      list(pool.map(_render_batch, batches))
+  return paths
+
+def report(data, directory, percentile=80, col_names=['RA9', 'RAA', 'RAR', 'WAA', 'WAR'], n_simulations=10000, fmt='png', workers=1, seed=None):
+  '''
+  Renders the bootstrap histogram and scatter plot of every season and column of interest,
+  plus the bootstrap histogram of the sum of all seasons
+
+  Parameters
+  ----------
+  data - rp_data instance
+
+  directory - str of directory to write to
+
+  percentile - int of percentile to split dataframes by
+
+  col_names - list of str of column names of interest
+
+  n_simulations - number of times to bootstrap, default to 10000
+
+  fmt, workers - passed to render
+
+  seed - int seed for reproducible resamples, default to None
+
+  Returns
+  ----------
+  list of str of written file paths
+
+  '''
+  rng = np.random.default_rng(seed)
+  results = []
+  for col_name in col_names:
+    for year in data.years:
+      results.append(data.bootstrap(year, percentile, col_name, n_simulations, rng, plot=False))
+      results.append(data.scatter(year, percentile, col_name, plot=False))
+    results.append(data.bootstrap_sum(percentile, col_name, n_simulations, rng, plot=False))
+  return render(results, directory, fmt, workers)
@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+from bootstrap import _chunk_rows, DEFAULT_MAX_MEMORY
+
+# Terms of the salary efficiency model, the season fixed effects follow as season[year] for every season but the first
+REGRESSORS = ['log_Salary', 'Age', 'GR%']
+TERMS = ['Intercept'] + REGRESSORS
+
+def regressors(df):
+  '''
+  Returns the log(Salary), Age and GR% columns of a cleaned dataframe as a float matrix
+
+  Parameters
+  ----------
+  df - cleaned dataframe of one or more seasons
+
+  Returns
+  ----------
+  np.array of shape (rows, 3)
+
+  '''
+  return np.column_stack([np.log(df['Salary'].to_numpy(dtype=float)), df['Age'].to_numpy(dtype=float), df['GR%'].to_numpy(dtype=float)])
+
+def group_means(values, codes, n_groups):
+  '''
+  Returns the mean of every column of values within each group
+
+  Parameters
+  ----------
+  values - np.array of shape (rows, k)
+
+  codes - np.array of int of the group of every row
+
+  n_groups - int of number of groups
+
+  Returns
+  ----------
+  np.array of shape (n_groups, k)
+
+  '''
+  counts = np.bincount(codes, minlength=n_groups)
+  sums = np.stack([np.bincount(codes, weights=values[:, j], minlength=n_groups) for j in range(values.shape[1])], axis=1)
+  return sums / counts[:, None]
+
+def least_squares(X, Y):
+  '''
+  Fits every column of Y on X with one QR decomposition of X
+
+  Parameters
+  ----------
+  X - np.array of shape (rows, terms)
+
+  Y - np.array of shape (rows, metrics)
+
+  Returns
+  ----------
+  Tuple of the coefficients of shape (terms, metrics), residuals of shape (rows, metrics) and the inverse of R,
+  so the coefficients are R^-1 Q'Y and (X'X)^-1 = R^-1 R^-T
+
+  '''
+  from scipy.linalg import solve_triangular
+  Q, R = np.linalg.qr(X)
+  beta = solve_triangular(R, Q.T @ Y)
+  return beta, Y - X @ beta, solve_triangular(R, np.eye(R.shape[0]))
+
+def cluster_scores(X, R_inv, residuals, clusters, n_clusters):
+  '''
+  Returns the contribution of every cluster to the coefficients of every metric, (X'X)^-1 times the cluster sums of X times
+  the residuals, of shape (clusters, terms, metrics). The coefficients move by these when a cluster's residuals change sign.
+  '''
+  sums = np.stack([group_means(X * residuals[:, j, None], clusters, n_clusters) for j in range(residuals.shape[1])], axis=2)
+  sums *= np.bincount(clusters, minlength=n_clusters)[:, None, None]
+  return np.einsum('kp,pq,gqm->gkm', R_inv, R_inv.T, sums)
+
+def fixed_effect_scores(scores, residuals, clusters, n_clusters, season_codes, season_means, seasons):
+  '''
+  Returns the cluster scores of the season intercepts in seasons, each being the season's mean of the metric less
+  the season's mean of the regressors times the coefficients, of shape (clusters, len(seasons), metrics)
+  '''
+  counts = np.bincount(season_codes, minlength=len(season_means))[seasons]
+  position = np.full(len(season_means), -1)
+  position[seasons] = np.arange(len(seasons))
+  rows = np.flatnonzero(position[season_codes] >= 0)
+  key = clusters[rows] * len(seasons) + position[season_codes[rows]]
+  result = np.empty((n_clusters, len(seasons), residuals.shape[1]))
+  for j in range(residuals.shape[1]):
+    residual_sums = np.bincount(key, weights=residuals[rows, j], minlength=n_clusters * len(seasons)).reshape(n_clusters, len(seasons))
+    result[:, :, j] = residual_sums / counts - scores[:, :, j] @ season_means[seasons].T
+  return result
+
+def cluster_se(scores, n, p):
+  '''
+  Cluster robust (CR1) standard errors from the cluster scores of the coefficients
+
+  Parameters
+  ----------
+  scores - np.array of shape (clusters, terms, metrics)
+
+  n - int of rows
+
+  p - int of terms of the model including every fixed effect
+
+  Returns
+  ----------
+  np.array of standard errors of shape (terms, metrics)
+
+  '''
+  G = len(scores)
+  return np.sqrt(G / (G - 1) * (n - 1) / (n - p) * (scores**2).sum(axis=0))
+
+def bootstrap_se(scores, resamples=999, rng=None, max_memory=DEFAULT_MAX_MEMORY):
+  '''
+  Wild cluster bootstrap standard errors: the residuals of each cluster are flipped in sign together with Rademacher
+  weights. The regressors never change, so each resample moves the coefficients by the weighted sum of the cluster scores
+  and every resample, term and metric comes out of one matrix product per chunk of weights, without refitting.
+
+  Parameters
+  ----------
+  scores - np.array of shape (clusters, terms, metrics)
+
+  resamples - int of number of bootstrap samples
+
+  rng - np.random.Generator or int seed, default to None
+
+  max_memory - upper bound in bytes of one chunk of weights
+
+  Returns
+  ----------
+  np.array of standard errors of shape (terms, metrics)
+
+  '''
+  rng = np.random.default_rng(rng)
+  G = len(scores)
+  flat = scores.reshape(G, -1)
+  rows = _chunk_rows(G * np.dtype(float).itemsize, resamples, None, max_memory)
+  shifts = np.concatenate([(rng.integers(0, 2, size=(min(rows, resamples - start), G)) * 2.0 - 1) @ flat
+                           for start in range(0, resamples, rows)])
+  return shifts.std(axis=0, ddof=1).reshape(scores.shape[1:])
+
+def fit_regression(df, col_names, se='cluster', cluster='Name', resamples=999, rng=None, season_col='file_year_x', fixed_effects=False):
+  '''
+  Fits metric ~ log(Salary) + Age + GR% + season fixed effects for every metric at once. The fixed effects are absorbed by
+  taking the season means out of the regressors and metrics, so every metric shares one QR decomposition of a three column
+  matrix however many seasons there are, with the same coefficients and residuals as the regression on season dummies.
+  The intercept (the first season's) and the other seasons' effects are read off the season means afterwards.
+  Rows with a missing value in any metric are left out.
+
+  Parameters
+  ----------
+  df - cleaned dataframe of one or more seasons
+
+  col_names - list of str of metrics
+
+  se - 'cluster' for cluster robust standard errors, 'bootstrap' for the wild cluster bootstrap, 'classical' for homoskedastic ones
+
+  cluster - str of the column rows are clustered by, default to Name so a pitcher's seasons may correlate
+
+  resamples - int of number of bootstrap samples when se='bootstrap'
+
+  rng - np.random.Generator or int seed of the bootstrap, default to None
+
+  season_col - str of the column holding the season
+
+  fixed_effects - also return the season fixed effects, default to False which only returns TERMS. The model has them either way
+
+  Returns
+  ----------
+  Dataframe indexed by metric and term showing the coefficient, standard error, t statistic and pvalue, and the R^2 and rows of each metric
+
+  '''
+  from scipy import stats
+  if se not in ('cluster', 'bootstrap', 'classical'):
+    raise ValueError(f"Unknown standard errors '{se}', use 'cluster', 'bootstrap' or 'classical'.")
+  Y = df[list(col_names)].to_numpy(dtype=float)
+  complete = ~np.isnan(Y).any(axis=1)
+  df, Y = df[complete], Y[complete]
+  X = regressors(df)
+  season_codes, seasons = pd.factorize(df[season_col], sort=True)
+  n_seasons = len(seasons)
+  X_means, Y_means = group_means(X, season_codes, n_seasons), group_means(Y, season_codes, n_seasons)
+  beta, residuals, R_inv = least_squares(X - X_means[season_codes], Y - Y_means[season_codes])
+  n, p = len(Y), X.shape[1] + n_seasons
+  # season intercepts, the first season's is the intercept and the others are reported against it
+  alpha = Y_means - X_means @ beta
+  shown = np.arange(n_seasons) if fixed_effects == True else np.arange(1)
+  coefs = np.vstack([alpha[:1], beta, alpha[shown[1:]] - alpha[0]])
+
+  if se == 'classical':
+    sigma2 = (residuals**2).sum(axis=0) / (n - p)
+    counts = np.bincount(season_codes, minlength=n_seasons)
+    V = R_inv @ R_inv.T
+    d = X_means[shown[1:]] - X_means[0]
+    factors = np.concatenate([[1 / counts[0] + X_means[0] @ V @ X_means[0]], np.diag(V),
+                              1 / counts[shown[1:]] + 1 / counts[0] + np.einsum('sp,pq,sq->s', d, V, d)])
+    ses = np.sqrt(np.outer(factors, sigma2))
+    dof = n - p
+  else:
+    clusters, cluster_values = pd.factorize(df[cluster])
+    G = len(cluster_values)
+    scores = cluster_scores(X - X_means[season_codes], R_inv, residuals, clusters, G)
+    alpha_scores = fixed_effect_scores(scores, residuals, clusters, G, season_codes, X_means, shown)
+    scores = np.concatenate([alpha_scores[:, :1], scores, alpha_scores[:, 1:] - alpha_scores[:, :1]], axis=1)
+    ses = cluster_se(scores, n, p) if se == 'cluster' else bootstrap_se(scores, resamples, rng)
+    dof = G - 1
+  with np.errstate(invalid='ignore', divide='ignore'):
+    t_stats = coefs / ses
+  r2 = 1 - (residuals**2).sum(axis=0) / ((Y - Y.mean(axis=0))**2).sum(axis=0)
+  terms = TERMS + [f'season[{season}]' for season in seasons[shown[1:]]]
+  index = pd.MultiIndex.from_product([col_names, terms], names=['col_name', 'term'])
+  return pd.DataFrame({'coef': coefs.T.ravel(), 'se': ses.T.ravel(), 'statistic': t_stats.T.ravel(),
+                       'p-values': 2 * stats.t.sf(np.abs(t_stats.T.ravel()), dof),
+                       'r2': np.repeat(r2, len(terms)), 'n': n}, index=index)
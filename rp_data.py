@@ -1,21 +1,160 @@
 import numpy as np
 import pandas as pd
-from scipy import stats
+from concurrent.futures import ProcessPoolExecutor
 from bootstrap import *
-
+from plots import *
+from online import accumulate, ttest, pearson
+from ci import group_intervals, intervals_df, CI_KINDS
+from regression import fit_regression
+from panel import player_panel, PANEL_COLUMNS
+from instrument import instrument_methods, count_cache
+
+# helpers called once per season or split are left out, their callers are timed
+@instrument_methods(skip=('split', 'season_df', 'year', 'clear_split_cache', 'split_cache_info'))
 class rp_data():
   def __init__(self, dfs):
     '''
-    Instantiates a relief pitcher data class using lists of dataframes
+    Instantiates a relief pitcher data class using lists of dataframes. The seasons are concatenated into self.data,
+    so the frames passed in are copied and changing them afterwards does not change the results.
 
     Parameters
     ----------
-    dfs - list of dataframes
+    dfs - list of dataframes, one per season, or a single dataframe of every season
 
     '''
     self.dfs = dfs
-    years = pd.concat(self.dfs)
-    self.years = years.file_year_x.unique()
+
+  @property
+  def dfs(self):
+    '''
+    List of the season dataframes, sliced from the concatenated frame in self.data. Each read returns new slices
+    with an extra categorical year column, so changing them has no effect: change self.data or assign a new list to dfs
+
+    '''
+    return [self.season_df(idx) for idx in range(len(self.season_slices))]
+
+  @dfs.setter
+  def dfs(self, dfs):
+    '''
+    Stores the seasons as one concatenated frame with a categorical year column and indexes the rows of each season
+
+    Parameters
+    ----------
+    dfs - list of dataframes, one per season, or a single dataframe of every season
+
+    '''
+    if isinstance(dfs, pd.DataFrame):
+      dfs = [df for year, df in dfs.groupby('file_year_x', sort=False, observed=True)]
+    dfs = [df for df in dfs if len(df)]
+    data = pd.concat(dfs)
+    # seasons with different categories concatenate to object columns, categorize them again over every season
+    for col_name in dfs[0].select_dtypes('category'):
+      data[col_name] = data[col_name].astype('category')
+    self.years = np.array([df.file_year_x.iloc[0] for df in dfs], dtype=object)
+    # concat drops attrs that differ between seasons, so the bytes recorded by compact_df are kept here
+    self.uncompacted_bytes = [df.attrs.get('uncompacted_bytes') for df in dfs]
+    data['year'] = pd.Categorical(data.file_year_x, categories=self.years)
+    bounds = np.cumsum([0] + [len(df) for df in dfs])
+    self.season_slices = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+    self.year_idx = {year: idx for idx, year in enumerate(self.years)}
+    self.data = data
+    self.clear_split_cache()
+
+  def clear_split_cache(self):
+    '''
+    Empties the cache of percentile splits and resets its counters, called whenever dfs is set
+
+    '''
+    self.split_cache = {}
+    self.split_hits = 0
+    self.split_misses = 0
+
+  def split_cache_info(self):
+    '''
+    Returns the hits, misses and number of entries of the percentile split cache
+
+    Returns
+    ----------
+    dict
+
+    '''
+    return {'hits': self.split_hits, 'misses': self.split_misses, 'size': len(self.split_cache)}
+
+  def split(self, idx, percentile):
+    '''
+    Returns the salary cut-off of a season and the rows of self.data in the higher paid and lower paid groups.
+    Splits are cached by year and percentile.
+
+    Parameters
+    ----------
+    idx - index of dataframe
+
+    percentile - int of percentile to split dataframe by
+
+    Returns
+    ----------
+    Tuple of the cut-off, np.array of higher paid row positions and np.array of lower paid row positions
+
+    '''
+    key = (self.years[idx], percentile)
+    count_cache('split', key in self.split_cache)
+    if key in self.split_cache:
+      self.split_hits += 1
+      return self.split_cache[key]
+    self.split_misses += 1
+    slc = self.season_slices[idx]
+    salary = self.data.Salary.to_numpy()[slc]
+    cut_off = np.percentile(salary, percentile)
+    higher = salary >= cut_off
+    self.split_cache[key] = (cut_off, np.flatnonzero(higher) + slc.start, np.flatnonzero(~higher) + slc.start)
+    return self.split_cache[key]
+
+  def memory_report(self):
+    '''
+    Returns the bytes each season takes now against the bytes compact_df measured before compacting it.
+    Seasons that did not go through compact_df show no saving.
+
+    Returns
+    ----------
+    Dataframe indexed by year showing bytes before and after and the share of memory saved
+
+    '''
+    after = [self.season_df(idx).drop(columns='year').memory_usage(deep=True).sum() for idx in range(len(self.season_slices))]
+    before = [size if size is not None else now for size, now in zip(self.uncompacted_bytes, after)]
+    df = pd.DataFrame({'before': before, 'after': after}, index=pd.Index(self.years, name='year'))
+    df['saved'] = 1 - df['after'] / df['before']
+    return df
+
+  def season_df(self, idx):
+    '''
+    Returns the dataframe of a season as a slice of the concatenated frame
+
+    Parameters
+    ----------
+    idx - index of dataframe
+
+    Returns
+    ----------
+    Dataframe
+
+    '''
+    return self.data.iloc[self.season_slices[idx]]
+
+  def separate_sum_df(self, percentile):
+    '''
+    Separates every season into higher paid and lower paid salary groups by its own percentile and returns the groups of all seasons together
+
+    Parameters
+    ----------
+    percentile - int of percentile to split each season by
+
+    Returns
+    ----------
+    Tuple of two dataframes, one dataframe of the higher paid groups and the other of the lower paid groups.
+
+    '''
+    cut_offs, hp_rows, lp_rows = zip(*[self.split(idx, percentile) for idx in range(len(self.season_slices))])
+    return (self.data.take(np.concatenate(hp_rows)), self.data.take(np.concatenate(lp_rows)))
 
   def __str__(self):
     '''
@@ -42,12 +181,7 @@ class rp_data():
     idx of dataframe that corresponds to year
 
     '''
-    year_to_find = str(year_of_interest)
-    self.idx = ''
-    for num in range(len(self.dfs)):
-      if self.dfs[num].file_year_x.unique()[0] == year_to_find:
-        self.idx = num
-        break
+    self.idx = self.year_idx.get(str(year_of_interest), '')
     return self.idx
 
   def separate_df(self, idx, percentile):
@@ -66,12 +200,53 @@ class rp_data():
     Tuple of two dataframes, one dataframe of the higher paid group and the other of the lower paid group.
 
     '''
-    dfs = self.dfs
-    salary = dfs[idx].Salary
-    cut_off = np.percentile(salary, percentile)
-    self.higher_paid, self.lower_paid = dfs[idx][salary >= cut_off], dfs[idx][salary < cut_off]
+    cut_off, hp_rows, lp_rows = self.split(idx, percentile)
+    self.higher_paid, self.lower_paid = self.data.take(hp_rows), self.data.take(lp_rows)
     return (self.higher_paid, self.lower_paid)
 
+  def accumulators(self, idx, percentile, col_names):
+    '''
+    Returns the accumulators of the higher paid and lower paid groups of a season, holding the moments of the columns
+    of interest and Salary. Accumulators of several seasons add up with + or sum() to the moments of all their rows.
+
+    Parameters
+    ----------
+    idx - index of dataframe
+
+    percentile - int of percentile to split dataframe by
+
+    col_names - list of str of column names of interest
+
+    Returns
+    ----------
+    Tuple of the accumulators of the higher paid and lower paid group
+
+    '''
+    cut_off, hp_rows, lp_rows = self.split(idx, percentile)
+    # the season's rows are taken before converting to float, so the seasons of sum_accumulators do not each convert all of self.data
+    columns = [self.data[col_name].to_numpy() for col_name in col_names]
+    salary = self.data.Salary.to_numpy()
+    return tuple(accumulate(np.column_stack([column[rows] for column in columns]).astype(float), salary[rows].astype(float))
+                 for rows in (hp_rows, lp_rows))
+
+  def sum_accumulators(self, percentile, col_names):
+    '''
+    Returns the accumulators of the higher paid and lower paid groups of all seasons, each season split by its own percentile
+
+    Parameters
+    ----------
+    percentile - int of percentile to split each season by
+
+    col_names - list of str of column names of interest
+
+    Returns
+    ----------
+    Tuple of the accumulators of the higher paid and lower paid groups
+
+    '''
+    hps, lps = zip(*[self.accumulators(idx, percentile, col_names) for idx in range(len(self.season_slices))])
+    return sum(hps), sum(lps)
+
   def return_stats(self, year, percentile, col_name):
     '''
     Draw p-values and means of samples from dataframes and columns of interest separating dataframe entries by percentiles
@@ -90,14 +265,11 @@ class rp_data():
     Tuple of pvalue, mean of the column from the higher paid group, mean of the column from the lower paid group
 
     '''
-    idx = self.year(year)
-    df = self.dfs[idx]
-    higher_paid, lower_paid = self.separate_df(idx, percentile)
-    column1, column2 = higher_paid[f'{col_name}'], lower_paid[f'{col_name}']
-    t_stat, pvalue = stats.ttest_ind(column1, column2)
-    return pvalue, column1.mean(), column2.mean()
+    hp, lp = self.accumulators(self.year(year), percentile, [col_name])
+    t_stats, pvalues = ttest(hp, lp)
+    return pvalues[0], hp.mean[0], lp.mean[0]
 
-  def create_df(self, year, percentile, col_names):
+  def create_df(self, year, percentile, col_names, test='student'):
     '''
     Create a dataframe of pvalues, means of columns tested.
 
@@ -109,20 +281,16 @@ class rp_data():
 
     col_names - list of str of column names of interest 
 
+    test - 'student', 'welch' or 'mannwhitney', default to student's t-test
+
     Returns
     -------
     Dataframe showing pvalues, means of the columns from the higher paid group, means of the columns from the lower paid group
     
     '''
     idx = self.year(year)
-    pvalues = []
-    hp_means = []
-    lp_means = []
-    for col_name in col_names:
-      pvalue, hp_mean, lp_mean = self.return_stats(year, percentile, col_name)
-      pvalues.append(pvalue)
-      hp_means.append(hp_mean)
-      lp_means.append(lp_mean)
+    higher_paid, lower_paid = self.separate_df(idx, percentile)
+    t_stats, pvalues, hp_means, lp_means = compare_groups(higher_paid, lower_paid, col_names, test)
     d = {'p-values': pvalues, 'hp_means': hp_means, 'lp_means': lp_means}  
     df = pd.DataFrame(d, index=[col_names]) 
     return df
@@ -131,6 +299,7 @@ class rp_data():
     '''
     Draw p-values and means of samples from the sum of all dataframes and 
     columns of interest separating dataframe entries by percentiles using student's t-test.
+    The accumulators of each season are added up instead of concatenating the seasons.
 
     Parameters
     ----------
@@ -143,21 +312,11 @@ class rp_data():
     Tuple of pvalue, mean of the column from the higher paid group, mean of the column from the lower paid group
 
     '''
-    high_paid = []
-    low_paid = []
-    for idx in range(len(self.dfs)):
-      hp, lp = self.separate_df(idx, percentile)
-      high_paid.append(hp)
-      low_paid.append(lp)
-    hps = pd.concat(high_paid)
-    lps = pd.concat(low_paid)
-    self.higher_paid_sum = hps
-    self.lower_paid_sum = lps
-    column1, column2 = hps[f'{col_name}'], lps[f'{col_name}']
-    t_stat, pvalue = stats.ttest_ind(column1, column2)
-    return (pvalue, column1.mean(), column2.mean())
+    hps, lps = self.sum_accumulators(percentile, [col_name])
+    t_stats, pvalues = ttest(hps, lps)
+    return (pvalues[0], hps.mean[0], lps.mean[0])
 
-  def create_sum_df(self, percentile, col_names):
+  def create_sum_df(self, percentile, col_names, test='student'):
     '''
     Create a dataframe of the sum of all dataframes imported of pvalues, means of columns tested.
 
@@ -167,26 +326,169 @@ class rp_data():
 
     col_names - list of str of column names of interest 
 
+    test - 'student', 'welch' or 'mannwhitney', default to student's t-test
+
     Returns
     -------
     Dataframe showing pvalues, means of the columns from the higher paid group, means of the columns from the lower paid group of the sum of all years
 
     '''
-    pvalues = []
-    hp_means = []
-    lp_means = []
-    for col_name in col_names:
-      pvalue, hp_mean, lp_mean = self.sum_data(percentile, col_name)
-      pvalues.append(pvalue)
-      hp_means.append(hp_mean)
-      lp_means.append(lp_mean)
+    hps, lps = self.separate_sum_df(percentile)
+    self.higher_paid_sum = hps
+    self.lower_paid_sum = lps
+    t_stats, pvalues, hp_means, lp_means = compare_groups(hps, lps, col_names, test)
     d = {'p-values': pvalues, 'hp_means': hp_means, 'lp_means': lp_means}
     df = pd.DataFrame(d, index=[col_names])
     return df
 
+  def year_groups(self, year, percentile):
+    '''
+    Returns the higher paid and lower paid groups of a year, or of the sum of all dataframes
+
+    Parameters
+    ----------
+    year - int of year of interest, or 'all' for the sum of all dataframes
+
+    percentile - int of percentile to split dataframes by
+
+    Returns
+    -------
+    Tuple of two dataframes, one dataframe of the higher paid group and the other of the lower paid group.
+
+    '''
+    if year == 'all':
+      return self.separate_sum_df(percentile)
+    return self.separate_df(self.year(year), percentile)
+
+  def test_table(self, years, percentiles, col_names, test='student'):
+    '''
+    Create a dataframe of pvalues, test statistics and means for every year, percentile and column in one call.
+    Each split is tested on all columns at once.
+
+    Parameters
+    ----------
+    years - list of int of years of interest, 'all' tests the sum of all dataframes
+
+    percentiles - list of int of percentiles to split dataframes by
+
+    col_names - list of str of column names of interest
+
+    test - 'student', 'welch' or 'mannwhitney', default to student's t-test
+
+    Returns
+    -------
+    Dataframe indexed by year, percentile and column showing pvalues, means of the higher paid and lower paid groups and the test statistic
+
+    '''
+    results = []
+    for year in years:
+      for percentile in percentiles:
+        hp, lp = self.year_groups(year, percentile)
+        results.append(np.column_stack(compare_groups(hp, lp, col_names, test)))
+    index = pd.MultiIndex.from_product([years, percentiles, col_names], names=['year', 'percentile', 'col_name'])
+    df = pd.DataFrame(np.vstack(results), index=index, columns=['statistic', 'p-values', 'hp_means', 'lp_means'])
+    return df[['p-values', 'hp_means', 'lp_means', 'statistic']]
+
+  def percentile_sweep(self, year, col_names, percentiles=range(50, 96)):
+    '''
+    Student's t-test of the higher paid vs lower paid groups for every percentile cut-off at once.
+    Each season is sorted by salary once, so every cut-off splits it into a prefix (lower paid) and a suffix (higher paid)
+    whose sums and sums of squares are read off cumulative sums. Each column drops its own NaN entries only, like rate_tests,
+    so rate columns like SV% and IS% are tested on the players with a value.
+
+    Parameters
+    ----------
+    year - int of year of interest, or 'all' to split each season by its own cut-off and pool the groups like create_sum_df
+
+    col_names - list of str of column names of interest
+
+    percentiles - list of int of percentiles to split dataframes by, default to 50 through 95
+
+    Returns
+    -------
+    Dataframe indexed by percentile and column showing pvalues, means and variances of the higher paid and lower paid groups,
+    the t statistic and the number of players with a value in each group
+
+    '''
+    from scipy import stats
+    percentiles = np.asarray(list(percentiles))
+    idxs = range(len(self.season_slices)) if year == 'all' else [self.year(year)]
+    values = self.data[list(col_names)].to_numpy(dtype=float)
+    # the variances are read off cumulative sums of squares, taken about the overall mean so that sq - sum**2 / n
+    # does not subtract two large numbers for columns like RA9 whose mean is far from zero
+    shift = np.nanmean(values, axis=0)
+    shape = (len(percentiles), len(col_names))
+    n_hp, n_lp = np.zeros(shape, dtype=int), np.zeros(shape, dtype=int)
+    hp_sum, lp_sum, hp_sq, lp_sq = np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    for idx in idxs:
+      slc = self.season_slices[idx]
+      salary = self.data.Salary.to_numpy()[slc]
+      order = np.argsort(salary, kind='stable')
+      x = values[slc][order] - shift
+      valid = ~np.isnan(x)
+      x = np.where(valid, x, 0)
+      counts = np.vstack([np.zeros(len(col_names), dtype=int), np.cumsum(valid, axis=0)])
+      cum = np.vstack([np.zeros(len(col_names)), np.cumsum(x, axis=0)])
+      cum_sq = np.vstack([np.zeros(len(col_names)), np.cumsum(x**2, axis=0)])
+      starts = np.searchsorted(salary[order], np.percentile(salary, percentiles), side='left')
+      n_lp += counts[starts]
+      n_hp += counts[-1] - counts[starts]
+      lp_sum += cum[starts]
+      lp_sq += cum_sq[starts]
+      hp_sum += cum[-1] - cum[starts]
+      hp_sq += cum_sq[-1] - cum_sq[starts]
+    n1, n2 = n_hp, n_lp
+    hp_var, lp_var = (hp_sq - hp_sum**2 / n1) / (n1 - 1), (lp_sq - lp_sum**2 / n2) / (n2 - 1)
+    hp_means, lp_means = hp_sum / n1 + shift, lp_sum / n2 + shift
+    dof = n1 + n2 - 2
+    pooled_var = ((n1 - 1) * hp_var + (n2 - 1) * lp_var) / dof
+    t_stats = (hp_means - lp_means) / np.sqrt(pooled_var * (1 / n1 + 1 / n2))
+    pvalues = 2 * stats.t.sf(np.abs(t_stats), dof)
+    index = pd.MultiIndex.from_product([percentiles, col_names], names=['percentile', 'col_name'])
+    d = {'p-values': pvalues, 'hp_means': hp_means, 'lp_means': lp_means, 'hp_var': hp_var, 'lp_var': lp_var, 'statistic': t_stats,
+         'n_hp': n1, 'n_lp': n2}
+    return pd.DataFrame({key: np.ravel(value) for key, value in d.items()}, index=index)
+
 #The next two functions are edge cases where I was not too sure what to do with the NaN values. 
 #I decided to drop the entries with NaN from the dataset since some relief pitchers may never be called upon a save situation or situation with runners on base.
 
+  def rate_tests(self, years, percentiles, col_names=['SV%', 'IS%'], test='student'):
+    '''
+    T-test of rate columns with missing values, like SV% and IS%, between the higher paid and lower paid groups
+    for every year and percentile in one call. Each column drops its own NaN entries only, and the groups
+    come from the cached splits.
+
+    Parameters
+    ----------
+    years - list of int of years of interest, 'all' tests the sum of all dataframes
+
+    percentiles - list of int of percentiles to split dataframes by
+
+    col_names - list of str of rate column names, default to SV% and IS%
+
+    test - 'student' or 'welch', default to student's t-test
+
+    Returns
+    -------
+    Dataframe indexed by year, percentile and column showing pvalues, means of the higher paid and lower paid groups,
+    the test statistic and the number of players with a value in each group
+
+    '''
+    if test not in ('student', 'welch'):
+      raise ValueError(f"Unknown test '{test}', use 'student' or 'welch'.")
+    results = []
+    for year in years:
+      for percentile in percentiles:
+        if year == 'all':
+          hp, lp = self.sum_accumulators(percentile, col_names)
+        else:
+          hp, lp = self.accumulators(self.year(year), percentile, col_names)
+        t_stats, pvalues = ttest(hp, lp, equal_var=(test == 'student'))
+        results.append(np.column_stack([pvalues, hp.mean, lp.mean, t_stats, hp.count, lp.count]))
+    index = pd.MultiIndex.from_product([years, percentiles, col_names], names=['year', 'percentile', 'col_name'])
+    df = pd.DataFrame(np.vstack(results), index=index, columns=['p-values', 'hp_means', 'lp_means', 'statistic', 'n_hp', 'n_lp'])
+    return df.astype({'n_hp': int, 'n_lp': int})
+
   def IS(self, year, percentile):
     '''
     Print a str of the means of inherited runners scored % by higher paid and lower paid group with the p-value.
@@ -199,18 +501,13 @@ class rp_data():
 
     Returns
     -------
-    str
+    Series of the rate_tests row of IS%
 
     '''
-    idx = self.year(year)
-    df = self.dfs[idx]
-    salary = df.Salary
-    cut_off = np.percentile(salary, percentile)
-    higher_paid, lower_paid = df[salary >= cut_off].drop('SV%', axis=1).dropna(), df[salary < cut_off].drop('SV%', axis=1).dropna()
-    column1, column2 = higher_paid['IS%'].map(clean_char), lower_paid['IS%'].map(clean_char)
-    t_stat, pvalue = stats.ttest_ind(column1, column2)
-    year = df.file_year_x.unique()[0]
-    return print(f'For the MLB season of {year}, the inherited runners scored % for the higher paid group is {column1.mean()}\nand the lower paid group % is {column2.mean()} with a p-value of {pvalue}.')
+    result = self.rate_tests([year], [percentile], ['IS%']).iloc[0]
+    year = self.years[self.year(year)]
+    print(f'For the MLB season of {year}, the inherited runners scored % for the higher paid group is {result["hp_means"]}\nand the lower paid group % is {result["lp_means"]} with a p-value of {result["p-values"]}.')
+    return result
 
   def SV(self, year, percentile):
     '''
@@ -224,20 +521,15 @@ class rp_data():
 
     Returns
     -------
-    str
+    Series of the rate_tests row of SV%
 
     '''
-    idx = self.year(year)
-    df = self.dfs[idx]
-    salary = df.Salary
-    cut_off = np.percentile(salary, percentile)
-    higher_paid, lower_paid = df[salary >= cut_off].drop('IS%', axis=1).dropna(), df[salary < cut_off].drop('IS%', axis=1).dropna()
-    column1, column2 = higher_paid['SV%'].map(clean_char), lower_paid['SV%'].map(clean_char)
-    t_stat, pvalue = stats.ttest_ind(column1, column2)
-    year = df.file_year_x.unique()[0]
-    return print(f'For the MLB season of {year}, the save opportunities converted % for the higher paid group is {column1.mean()}\nand the lower paid group % is {column2.mean()} with a p-value of {pvalue}.')
+    result = self.rate_tests([year], [percentile], ['SV%']).iloc[0]
+    year = self.years[self.year(year)]
+    print(f'For the MLB season of {year}, the save opportunities converted % for the higher paid group is {result["hp_means"]}\nand the lower paid group % is {result["lp_means"]} with a p-value of {result["p-values"]}.')
+    return result
 
-  def bootstrap(self, year, percentile, col_name, n_simulations=10000):
+  def bootstrap(self, year, percentile, col_name, n_simulations=10000, rng=None, plot=True):
     '''
     Resamples from a dataframe by percentile on the column of interest per # of simulations.
     Create a histogram of the bootstrapped data.
@@ -252,35 +544,34 @@ class rp_data():
 
     n_simulations - number of times to bootstrap, default to 10000
 
+    rng - np.random.Generator or int seed for reproducible resamples, default to None
+
+    plot - show the histogram, False only computes the result
+
     Returns
     -------
-    Histogram of the results with 95% CI, sample distribution means
+    Histogram of the results with 95% CI, sample distribution means, and the BootstrapResult
 
     '''
     idx = self.year(year)
     hp, lp = self.separate_df(idx, percentile)
-    bs_hp, bs_lp = bootstrap(np.array(hp[f'{col_name}']), n_simulations), bootstrap(np.array(lp[f'{col_name}']), n_simulations)
-    higher_paid_bs, lower_paid_bs = [sample.mean() for sample in bs_hp], [sample.mean() for sample in bs_lp]
-    self.lower_ci_hp, self.upper_ci_hp = np.percentile(higher_paid_bs, [2.5, 97.5])
-    self.lower_ci_lp, self.upper_ci_lp = np.percentile(lower_paid_bs, [2.5, 97.5])
-    self.hp_bs_mean = np.mean(higher_paid_bs)
-    self.lp_bs_mean = np.mean(lower_paid_bs)
-    fig, ax = plt.subplots(figsize = (12,4))
-    ax.hist(higher_paid_bs, alpha=0.5, bins=20, label='Higher Paid')
-    ax.hist(lower_paid_bs, alpha=0.5, bins=20, label ='Lower Paid')
-    ax.axvline(self.lower_ci_hp, color='blue', linestyle="--", alpha=0.5, label='Higher Paid 95% CI')
-    ax.axvline(self.upper_ci_hp, color='blue', linestyle="--", alpha=0.5)
-    ax.axvline(self.lower_ci_lp, color='red', linestyle="--", alpha=0.5, label='Lower Paid 95% CI')
-    ax.axvline(self.upper_ci_lp, color='red', linestyle="--", alpha=0.5)
-    ax.axvline(self.hp_bs_mean, color='green', linestyle="--", alpha=0.5, label='Higher Paid Mean')
-    ax.axvline(self.lp_bs_mean, color='black', linestyle="--", alpha=0.5, label='Lower Paid Mean')
-    ax.legend()
-    year = hp.file_year_x.unique()[0]
-    ax.set_xlabel(f'{col_name} means')
-    ax.set_ylabel('Count')
-    ax.set_title(f'{year} Bootstrapped {col_name} Sample Means Distribution')
-    plt.show()
-    plt.ion()
+    rng = np.random.default_rng(rng)
+    higher_paid_bs = bootstrap_statistic(np.array(hp[f'{col_name}']), n_simulations, rng=rng)
+    lower_paid_bs = bootstrap_statistic(np.array(lp[f'{col_name}']), n_simulations, rng=rng)
+    year = self.years[idx]
+    result = bootstrap_result(f'bootstrap-{year}-{percentile}-{col_name}', f'{year} Bootstrapped {col_name} Sample Means Distribution',
+                              col_name, higher_paid_bs, lower_paid_bs)
+    self.lower_ci_hp, self.upper_ci_hp = result.lower_ci_hp, result.upper_ci_hp
+    self.lower_ci_lp, self.upper_ci_lp = result.lower_ci_lp, result.upper_ci_lp
+    self.hp_bs_mean = result.hp_bs_mean
+    self.lp_bs_mean = result.lp_bs_mean
+    if plot == True:
+      import matplotlib.pyplot as plt
+      fig, ax = plt.subplots(figsize = (12,4))
+      draw_bootstrap(ax, result)
+      plt.show()
+      plt.ion()
+    return result
 
   def bootstrap_stats(self):
     '''
@@ -299,7 +590,7 @@ class rp_data():
     Lower Paid Group:{self.lp_bs_mean}
      ''')
 
-  def bootstrap_sum(self, percentile, col_name, n_simulations=10000):
+  def bootstrap_sum(self, percentile, col_name, n_simulations=10000, rng=None, plot=True):
     '''
     Resamples from a sum of the dataframes imported by percentile on the column of interest per # of simulations.
     Create a histogram of the bootstrapped data.
@@ -314,40 +605,33 @@ class rp_data():
 
     n_simulations - number of times to bootstrap, default to 10000
 
+    rng - np.random.Generator or int seed for reproducible resamples, default to None
+
+    plot - show the histogram, False only computes the result
+
     Returns
     -------
-    Histogram of the results with 95% CI, sample distribution means
-
-    '''
-    high_paid = []
-    low_paid = []
-    for idx in range(len(self.dfs)):
-      hp, lp = self.separate_df(idx, percentile)
-      high_paid.append(hp)
-      low_paid.append(lp)
-    hps = pd.concat(high_paid)
-    lps = pd.concat(low_paid)
-    bs_hp, bs_lp = bootstrap(np.array(hps[f'{col_name}']), n_simulations), bootstrap(np.array(lps[f'{col_name}']), n_simulations)
-    hp_bs_sum, lp_bs_sum = [sample.mean() for sample in bs_hp], [sample.mean() for sample in bs_lp]
-    self.lower_ci_hp_sum, self.upper_ci_hp_sum = np.percentile(hp_bs_sum, [2.5, 97.5])
-    self.lower_ci_lp_sum, self.upper_ci_lp_sum = np.percentile(lp_bs_sum, [2.5, 97.5])
-    self.hp_bs_sum_mean = np.mean(hp_bs_sum)
-    self.lp_bs_sum_mean = np.mean(lp_bs_sum)
-    fig, ax = plt.subplots(figsize = (12,4))
-    ax.hist(hp_bs_sum, alpha=0.5, bins=20, label = 'Higher Paid')
-    ax.hist(lp_bs_sum, alpha=0.5, bins=20, label = 'Lower Paid')
-    ax.axvline(self.lower_ci_hp_sum, color='blue', linestyle="--", alpha=0.5, label='Higher Paid 95% CI')
-    ax.axvline(self.upper_ci_hp_sum, color='blue', linestyle="--", alpha=0.5)
-    ax.axvline(self.lower_ci_lp_sum, color='red', linestyle="--", alpha=0.5, label='Lower Paid 95% CI')
-    ax.axvline(self.upper_ci_lp_sum, color='red', linestyle="--", alpha=0.5)
-    ax.axvline(self.hp_bs_sum_mean, color='green', linestyle="--", alpha=0.5, label='Higher Paid Mean')
-    ax.axvline(self.lp_bs_sum_mean, color='black', linestyle="--", alpha=0.5, label='Lower Paid Mean')
-    ax.legend()
-    ax.set_xlabel(f'{col_name} means')
-    ax.set_ylabel('Count')
-    ax.set_title(f'Bootstrapped {col_name} Sample Means Distribution from {self.years[-1]} to {self.years[0]}.')
-    plt.show()
-    plt.ion()
+    Histogram of the results with 95% CI, sample distribution means, and the BootstrapResult
+
+    '''
+    hps, lps = self.separate_sum_df(percentile)
+    rng = np.random.default_rng(rng)
+    hp_bs_sum = bootstrap_statistic(np.array(hps[f'{col_name}']), n_simulations, rng=rng)
+    lp_bs_sum = bootstrap_statistic(np.array(lps[f'{col_name}']), n_simulations, rng=rng)
+    result = bootstrap_result(f'bootstrap-all-{percentile}-{col_name}',
+                              f'Bootstrapped {col_name} Sample Means Distribution from {self.years[-1]} to {self.years[0]}.',
+                              col_name, hp_bs_sum, lp_bs_sum)
+    self.lower_ci_hp_sum, self.upper_ci_hp_sum = result.lower_ci_hp, result.upper_ci_hp
+    self.lower_ci_lp_sum, self.upper_ci_lp_sum = result.lower_ci_lp, result.upper_ci_lp
+    self.hp_bs_sum_mean = result.hp_bs_mean
+    self.lp_bs_sum_mean = result.lp_bs_mean
+    if plot == True:
+      import matplotlib.pyplot as plt
+      fig, ax = plt.subplots(figsize = (12,4))
+      draw_bootstrap(ax, result)
+      plt.show()
+      plt.ion()
+    return result
 
   def bootstrap_sum_stats(self):
     '''
@@ -366,6 +650,130 @@ class rp_data():
     Lower Paid Group:{self.lp_bs_sum_mean}
      ''')
 
+  def confidence_intervals(self, year, percentile, col_names, n_simulations=10000, confidence=.95, kinds=CI_KINDS, rng=None):
+    '''
+    Bootstrap confidence intervals of the means of the higher paid and lower paid groups and of the difference of their means,
+    for every column of interest. Each group is resampled once and the percentile, BCa and studentized intervals of every
+    column are all read off the same resamples.
+
+    Parameters
+    ----------
+    year - int of year of interest, or 'all' for the sum of all dataframes
+
+    percentile - int of percentile to split dataframes by
+
+    col_names - list of str of column names of interest
+
+    n_simulations - number of times to bootstrap, default to 10000
+
+    confidence - float of confidence level, default to .95
+
+    kinds - list of 'percentile', 'bca' and 'studentized', default to all three
+
+    rng - np.random.Generator or int seed for reproducible resamples, default to None
+
+    Returns
+    -------
+    Dataframe indexed by group ('diff', 'hp' or 'lp'), column and kind showing the estimate and the lower and upper bounds
+
+    '''
+    hp, lp = self.year_groups(year, percentile)
+    result = group_intervals(hp[list(col_names)].to_numpy(dtype=float), lp[list(col_names)].to_numpy(dtype=float),
+                             n_simulations, confidence, kinds, rng)
+    return intervals_df(result, col_names)
+
+  def bootstrap_grid(self, years, percentiles, col_names, n_simulations=10000, workers=1, seed=None):
+    '''
+    Bootstraps the sample means of the higher paid and lower paid groups for every combination of
+    year, percentile and column. Each group and column is one _bootstrap_task, spread over a process pool when workers > 1.
+
+    Parameters
+    ----------
+    years - list of int of years of interest, 'all' resamples from the sum of all dataframes like bootstrap_sum
+
+    percentiles - list of int of percentiles to split dataframes by
+
+    col_names - list of str of column names of interest
+
+    n_simulations - number of times to bootstrap, default to 10000
+
+    workers - int of processes to run the tasks on, 1 runs them in this process and None uses every cpu
+
+    seed - int or np.random.SeedSequence to spawn the task streams from, default to None
+
+    Returns
+    -------
+    Dataframe with one row per year, percentile, column and salary group showing the 95% CI bounds and mean of the bootstrapped sample means
+
+    '''
+    keys = []
+    tasks = []
+    for year in years:
+      for percentile in percentiles:
+        hp, lp = self.year_groups(year, percentile)
+        for col_name in col_names:
+          for group, df in (('hp', hp), ('lp', lp)):
+            keys.append((year, percentile, col_name, group))
+            tasks.append(np.array(df[f'{col_name}']))
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    args = zip(tasks, [n_simulations] * len(tasks), seeds)
+    if workers == 1:
+      results = [_bootstrap_task(arg) for arg in args]
+    else:
+      with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_bootstrap_task, args, chunksize=max(1, len(tasks) // (4 * (workers or 1)))))
+    df = pd.DataFrame(keys, columns=['year', 'percentile', 'col_name', 'group'])
+    df[['lower_ci', 'upper_ci', 'bs_mean']] = results
+    return df
+
+  def permutation_tests(self, years, percentiles, col_names, permutations=10000, alpha=.05, workers=1, seed=None):
+    '''
+    Permutation test of the difference in means of every column between the higher paid and lower paid groups,
+    for every year and percentile in one call. Unlike the t-tests it makes no assumption on the distribution of skewed
+    columns like RAA and WAR in small higher paid groups. The salary group labels are shuffled in batches and a test
+    stops early once its p-value is clearly above or below alpha. Each year and percentile is one _permutation_task,
+    testing every column together, and they run over a process pool when workers > 1.
+
+    Parameters
+    ----------
+    years - list of int of years of interest, 'all' tests the sum of all dataframes like create_sum_df
+
+    percentiles - list of int of percentiles to split dataframes by
+
+    col_names - list of str of column names of interest, NaN entries are left out of their column
+
+    permutations - int of most permutations per test, default to 10000
+
+    alpha - float of significance level to stop early at, None draws every permutation
+
+    workers - int of processes to run the tests on, 1 runs them in this process and None uses every cpu
+
+    seed - int or np.random.SeedSequence to spawn the test streams from, default to None
+
+    Returns
+    -------
+    Dataframe indexed by year, percentile and column showing pvalues, means of the higher paid and lower paid groups,
+    the difference in means and the number of permutations drawn
+
+    '''
+    tasks = []
+    for year in years:
+      for percentile in percentiles:
+        hp, lp = self.year_groups(year, percentile)
+        x = np.vstack([hp[list(col_names)].to_numpy(dtype=float), lp[list(col_names)].to_numpy(dtype=float)])
+        tasks.append((x, np.arange(len(x)) < len(hp)))
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    args = [(x, labels, permutations, alpha, task_seed) for (x, labels), task_seed in zip(tasks, seeds)]
+    if workers == 1:
+      results = [_permutation_task(arg) for arg in args]
+    else:
+      with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_permutation_task, args))
+    index = pd.MultiIndex.from_product([years, percentiles, col_names], names=['year', 'percentile', 'col_name'])
+    df = pd.DataFrame(np.vstack([np.column_stack(result) for result in results]), index=index,
+                      columns=['p-values', 'hp_means', 'lp_means', 'statistic', 'n_permutations'])
+    return df.astype({'n_permutations': int})
+
   def corr(self, year, percentile, col_name):
     '''
     Finds the pearson correlation coefficient of a given dataframe and column of interest separated by percentile.
@@ -383,36 +791,75 @@ class rp_data():
     Str of pearson correlation coefficients and their pvalues
 
     '''
-    idx = self.year(year)
-    hp, lp = self.separate_df(idx, percentile)
-    l_corr, l_pvalue = stats.pearsonr(lp.Salary, lp[f'{col_name}'])
-    h_corr, h_pvalue = stats.pearsonr(hp.Salary, hp[f'{col_name}'])
+    hp, lp = self.accumulators(self.year(year), percentile, [col_name])
+    (l_corr,), (l_pvalue,) = pearson(lp)
+    (h_corr,), (h_pvalue,) = pearson(hp)
     print(f'For the lower paid pitcher group: \nThe correlation coefficent is {l_corr} and the p-value is {l_pvalue}')
     print(f'For the higher paid pitcher group: \nThe correlation coefficent is {h_corr} and the p-value is {h_pvalue}')
 
   def corr_sum(self, percentile, col_name):
     '''
     Finds the pearson correlation coefficient of the sum of the dataframes and column of interest separated by percentile.
+    The accumulators of each season are added up instead of concatenating the seasons.
 
     Returns
     -------
     Str of pearson correlation coefficients and their pvalues
 
     '''
-    high_paid = []
-    low_paid = []
-    for idx in range(len(self.dfs)):
-      hp, lp = self.separate_df(idx, percentile)
-      high_paid.append(hp)
-      low_paid.append(lp)
-    hps = pd.concat(high_paid)
-    lps = pd.concat(low_paid)
-    l_corr, l_pvalue = stats.pearsonr(lps.Salary, lps[f'{col_name}'])
-    h_corr, h_pvalue = stats.pearsonr(hps.Salary, hps[f'{col_name}'])
+    hps, lps = self.sum_accumulators(percentile, [col_name])
+    (l_corr,), (l_pvalue,) = pearson(lps)
+    (h_corr,), (h_pvalue,) = pearson(hps)
     print(f'For the lower paid pitcher group: \nThe correlation coefficent is {l_corr} and the p-value is {l_pvalue}')
     print(f'For the higher paid pitcher group: \nThe correlation coefficent is {h_corr} and the p-value is {h_pvalue}')
 
-  def scatter(self, year, percentile, col_name):
+  def regression(self, col_names, years=None, se='cluster', fixed_effects=False, n_simulations=999, rng=None):
+    '''
+    Fits metric ~ log(Salary) + Age + GR% + season fixed effects over the seasons for every column of interest at once,
+    instead of splitting the pitchers into two salary groups. The log_Salary coefficient is the change in the metric
+    when a pitcher's salary grows by a factor of e, for pitchers of the same age, relief share and season.
+
+    Parameters
+    ----------
+    col_names - list of str of column names of interest
+
+    years - list of int of years to fit on, default to every season
+
+    se - 'cluster' for standard errors robust to a pitcher's seasons correlating, 'bootstrap' for the wild cluster bootstrap
+    of them, or 'classical'
+
+    fixed_effects - also return the season fixed effects, default to False. The model has them either way
+
+    n_simulations - number of bootstrap samples when se='bootstrap', default to 999
+
+    rng - np.random.Generator or int seed for reproducible resamples, default to None
+
+    Returns
+    -------
+    Dataframe indexed by column and term showing the coefficients, standard errors, t statistics, pvalues, R^2 and rows of each fit
+
+    '''
+    df = self.data
+    if years is not None:
+      df = pd.concat([self.season_df(self.year(year)) for year in years])
+    return fit_regression(df, col_names, se, 'Name', n_simulations, rng, fixed_effects=fixed_effects)
+
+  def panel(self, col_names=PANEL_COLUMNS):
+    '''
+    Follows every pitcher across the seasons, see panel.player_panel
+
+    Parameters
+    ----------
+    col_names - list of str of columns summed over each pitcher's seasons
+
+    Returns
+    ----------
+    player_panel of every season, more seasons can be added to it with add_season
+
+    '''
+    return player_panel(self.dfs, col_names)
+
+  def scatter(self, year, percentile, col_name, plot=True):
     '''
     Creates a scatter plot of a given dataframe by the salary and column of interest separated by percentile
 
@@ -424,35 +871,88 @@ class rp_data():
 
     col_name - str of column name of interest
 
+    plot - draw the scatter plot, False only computes the result
+
     Returns
     -------
-    Scatter plot
+    Scatter plot, and the ScatterResult
 
     '''
     idx = self.year(year)
     hp, lp = self.separate_df(idx, percentile)
-    fig, ax = plt.subplots()
-    ax.scatter(hp.Salary, hp[col_name], alpha =0.5, label='hp')
-    ax.scatter(lp.Salary, lp[col_name], alpha=0.5, label='lp')
-    ax.set_title(f'{year} Salary vs {col_name}')
-    ax.set_xlabel('Salary')
-    ax.set_ylabel(f'{col_name}')
-    ax.legend()
-
-def clean_char(val):
+    result = ScatterResult(f'scatter-{year}-{percentile}-{col_name}', f'{year} Salary vs {col_name}', col_name,
+                           hp.Salary.to_numpy(), hp[col_name].to_numpy(), lp.Salary.to_numpy(), lp[col_name].to_numpy())
+    if plot == True:
+      import matplotlib.pyplot as plt
+      fig, ax = plt.subplots()
+      draw_scatter(ax, result)
+    return result
+
+def compare_groups(hp, lp, col_names, test='student'):
+  '''
+  Tests every column of interest between the higher paid and lower paid groups in one call. NaN entries are left out
+  of their column, so the tests and means of columns like SV% use the same players
+
+  Parameters
+  ----------
+  hp - dataframe of the higher paid group
+
+  lp - dataframe of the lower paid group
+
+  col_names - list of str of column names of interest
+
+  test - 'student' or 'welch' for the t-test with equal or unequal variances, 'mannwhitney' for the Mann-Whitney U test
+
+  Returns
+  ----------
+  Tuple of np.arrays of the test statistics, pvalues, means of the higher paid group and means of the lower paid group
+
+  '''
+  from scipy import stats
+  column1 = np.asfortranarray(hp[list(col_names)].to_numpy(dtype=float))
+  column2 = np.asfortranarray(lp[list(col_names)].to_numpy(dtype=float))
+  if test == 'mannwhitney':
+    t_stats, pvalues = stats.mannwhitneyu(column1, column2, axis=0, nan_policy='omit')
+  elif test in ('student', 'welch'):
+    t_stats, pvalues = stats.ttest_ind(column1, column2, axis=0, equal_var=(test == 'student'), nan_policy='omit')
+  else:
+    raise ValueError(f"Unknown test '{test}', use 'student', 'welch' or 'mannwhitney'.")
+  return (t_stats, pvalues, np.nanmean(column1, axis=0), np.nanmean(column2, axis=0))
+
+def _bootstrap_task(args):
+  '''
+  Bootstraps the mean of one sample, used by rp_data.bootstrap_grid. The grid methods spawn one SeedSequence per task
+  from their seed and every task draws only from its own, so the results do not depend on the number of workers or on
+  which process runs a task. _permutation_task is seeded the same way.
+
+  Parameters
+  ----------
+  args - tuple of np.array of the sample, int of number of simulations, np.random.SeedSequence
+
+  Returns
+  ----------
+  Tuple of lower 95% CI bound, upper 95% CI bound and mean of the bootstrapped sample means
+
+  '''
+  x, n_simulations, seed = args
+  means = bootstrap_statistic(x, n_simulations, rng=np.random.default_rng(seed))
+  lower_ci, upper_ci = np.percentile(means, [2.5, 97.5])
+  return (lower_ci, upper_ci, means.mean())
+
+def _permutation_task(args):
   '''
-  Converts % string into float, will ignore NaN values
+  Permutation tests every column of one split, used by rp_data.permutation_tests and seeded like _bootstrap_task
 
   Parameters
   ----------
-  val - str
+  args - tuple of np.array of the higher paid rows followed by the lower paid rows, np.array of bool labels of the higher paid rows,
+  int of most permutations, float of alpha, np.random.SeedSequence
 
   Returns
   ----------
-  float
+  Tuple of np.arrays of pvalues, means of the higher paid group, means of the lower paid group, differences in means and permutations drawn
 
   '''
-  try:
-      return float(val.replace("%", "")) / 100
-  except:
-      return 0
+  x, labels, permutations, alpha, seed = args
+  statistic, pvalues, n_permutations = permutation_test(x, labels, permutations, alpha, rng=np.random.default_rng(seed))
+  return (pvalues, np.nanmean(x[labels], axis=0), np.nanmean(x[~labels], axis=0), statistic, n_permutations)
@@ -0,0 +1,327 @@
+import os
+import numpy as np
+import pandas as pd
+from web import RELIEVER_SCHEMA, VALUE_SCHEMA
+from data import prepare_dfs
+
+# Headers of the scraped tables, the csv files start with an unnamed index column
+RELIEVER_HEADER = ['Rk', 'Name', 'Age', 'Tm', 'IP', 'G', 'GR', 'GF', 'Wgr', 'Lgr', 'SVOpp', 'SV', 'BSv', 'SV%', 'SVSit', 'Hold',
+                   'IR', 'IS', 'IS%', '1stIP', 'aLI', 'LevHi', 'LevMd', 'LevLo', 'Ahd', 'Tie', 'Bhd', 'Runr', 'Empt', '>3o', '<3o',
+                   'IPmult', '0DR', 'Out/GR', 'Pit/GR']
+VALUE_HEADER = ['Rk', 'Name', 'Age', 'Tm', 'IP', 'G', 'GS', 'R', 'RA9', 'RA9opp', 'RA9def', 'RA9role', 'PPFp', 'RA9avg', 'RAA', 'WAA',
+                'gmLI', 'WAAadj', 'WAR', 'RAR', 'waaWL%', '162WL%', 'Salary', 'Acquired']
+
+# baseball-reference repeats the header row after every 25 players
+HEADER_EVERY = 25
+
+TEAMS = ['ARI', 'ATL', 'BAL', 'BOS', 'CHC', 'CHW', 'CIN', 'CLE', 'COL', 'DET', 'HOU', 'KCR', 'LAA', 'LAD', 'MIA',
+         'MIL', 'MIN', 'NYM', 'NYY', 'OAK', 'PHI', 'PIT', 'SDP', 'SEA', 'SFG', 'STL', 'TBR', 'TEX', 'TOR', 'WSN']
+FIRST_NAMES = ['Aaron', 'Adam', 'Alex', 'Andrew', 'Austin', 'Blake', 'Brad', 'Brandon', 'Brett', 'Bryan', 'Carlos', 'Chad',
+               'Chris', 'Cody', 'Dan', 'David', 'Drew', 'Edwin', 'Felix', 'Fernando', 'Jake', 'James', 'Jason', 'Joe',
+               'Jordan', 'Jose', 'Josh', 'Juan', 'Justin', 'Kevin', 'Kyle', 'Luis', 'Matt', 'Michael', 'Mike', 'Nick',
+               'Pedro', 'Ryan', 'Scott', 'Sean', 'Tommy', 'Tyler', 'Will', 'Zach']
+SYLLABLES = ['al', 'bar', 'ber', 'cal', 'dor', 'en', 'fen', 'gar', 'hal', 'ins', 'kel', 'lan', 'lo', 'mar', 'mil', 'nez',
+             'or', 'per', 'quin', 'ros', 'san', 'ton', 'val', 'wen', 'ver', 'zim']
+ACQUIRED = ['Traded', 'Free Agency', 'Amateur Draft', 'Amateur Free Agent', 'Waivers', 'Purchased', 'Rule 5 Draft']
+
+def team_codes(n_teams):
+  '''
+  Returns n_teams team abbreviations, the real ones first
+
+  Parameters
+  ----------
+  n_teams - int of number of teams
+
+  Returns
+  ----------
+  np.array of str
+
+  '''
+  extra = [f'T{k:02d}' for k in range(max(n_teams - len(TEAMS), 0))]
+  return np.array(TEAMS[:n_teams] + extra)
+
+def player_names(ids):
+  '''
+  Returns a distinct name for every player id, e.g. 'Tyler Bercalen'
+
+  Parameters
+  ----------
+  ids - np.array of int of player ids
+
+  Returns
+  ----------
+  np.array of str
+
+  '''
+  first, rest = np.divmod(ids, len(FIRST_NAMES))[::-1]
+  syllables = np.array(SYLLABLES)
+  n = len(SYLLABLES)
+  surname = np.char.add(np.char.capitalize(syllables[rest % n]), syllables[rest // n % n])
+  surname = np.char.add(surname, syllables[rest // n**2 % n])
+  names = np.char.add(np.char.add(np.array(FIRST_NAMES)[first], ' '), surname)
+  # a fourth syllable digit once the three syllable surnames run out
+  generation = rest // n**3
+  return np.where(generation > 0, np.char.add(names, np.char.add(' ', generation.astype(str))), names)
+
+def _pool(rng, pool, year, n_players, retention):
+  '''
+  Returns the players of a season: the survivors of last season's pool plus rookies up to n_players
+  '''
+  if pool is None:
+    pool = {'id': np.empty(0, dtype=np.int64), 'birth': np.empty(0, dtype=np.int64), 'lefty': np.empty(0, dtype=bool),
+            'name': np.empty(0, dtype=str), 'skill': np.empty(0), 'pay': np.empty(0), 'next_id': 0}
+  keep = (rng.random(len(pool['id'])) < retention) & (year - pool['birth'] < 41)
+  keep &= np.cumsum(keep) <= n_players
+  n_new = n_players - keep.sum()
+  ages = 21 + np.minimum(rng.gamma(2.0, 2.0, n_new), 15).astype(np.int64)
+  ids = pool['next_id'] + np.arange(n_new)
+  lefty = rng.random(n_new) < .3
+  names = player_names(ids)
+  return {'id': np.concatenate([pool['id'][keep], ids]),
+          'birth': np.concatenate([pool['birth'][keep], year - ages]),
+          'lefty': np.concatenate([pool['lefty'][keep], lefty]),
+          'name': np.concatenate([pool['name'][keep], np.where(lefty, np.char.add(names, '*'), names)]),
+          'skill': np.concatenate([pool['skill'][keep], rng.normal(0, 1, n_new)]),
+          'pay': np.concatenate([pool['pay'][keep], rng.normal(0, 1, n_new)]),
+          'next_id': pool['next_id'] + n_new}
+
+def _season(rng, pool, year, teams, traded_rate, starter_rate, salary_missing):
+  '''
+  Returns the reliever and value tables of a season as dataframes of the scraped columns, one row per team stint and one
+  TOT (reliever) or 2TM (value) row before the stints of every traded player. Empty cells are NaN.
+  '''
+  n = len(pool['id'])
+  names = pool['name']
+  age = year - pool['birth']
+  stints = 1 + (rng.random(n) < traded_rate)
+  starter = rng.random(n) < starter_rate
+  swingman = ~starter & (rng.random(n) < .12)
+  closer = ~starter & ~swingman & (rng.random(n) < .06)
+
+  # one row per team stint, players in order of their ids' names like baseball-reference sorts by name
+  player = np.repeat(np.arange(n), stints)
+  first_stint = np.r_[True, player[1:] != player[:-1]]
+  team = rng.integers(0, len(teams), len(player))
+  # a traded player's second team differs from the first
+  team = np.where(first_stint, team, (np.roll(team, 1) + 1 + rng.integers(0, max(len(teams) - 1, 1), len(player))) % len(teams))
+  games = np.where(starter, 33, np.where(swingman, 40, 55))[player] * (1 + .15 * rng.normal(size=len(player)))
+  games = np.maximum(np.round(games * rng.beta(.9, 1.2, len(player)) / stints[player]), 1).astype(np.int64)
+  start_share = np.where(starter, 1.0, np.where(swingman, rng.uniform(.5, 1, n), rng.beta(.3, 12, n)))[player]
+  starts = rng.binomial(games, start_share)
+  relief = games - starts
+  sv_opp = rng.binomial(relief, np.where(closer, .6, .03)[player])
+  saves = rng.binomial(sv_opp, .8)
+  inherited = rng.poisson(relief * rng.gamma(.6, .75, len(player)))
+  stranded_in = rng.binomial(inherited, .3)
+  outs = np.maximum(rng.poisson(starts * 16.5 + relief * 3.2), 1)
+  runs = rng.poisson(outs / 27 * 4.6 * np.exp(-.15 * pool['skill'][player] + .25 * rng.normal(size=len(player))))
+
+  # traded players' season totals, put before their stints
+  stint_rows = {'player': player, 'games': games, 'starts': starts, 'relief': relief, 'sv_opp': sv_opp, 'saves': saves,
+                'inherited': inherited, 'stranded_in': stranded_in, 'outs': outs, 'runs': runs}
+  totals = np.flatnonzero(stints > 1)
+  season_rows = {key: np.add.reduceat(values, np.flatnonzero(first_stint))[totals] for key, values in stint_rows.items()}
+  season_rows['player'] = totals
+  table = {key: np.concatenate([season_rows[key], stint_rows[key]]) for key in stint_rows}
+  table['team'] = np.concatenate([np.full(len(totals), -1), team])
+  order = np.lexsort((np.r_[np.zeros(len(totals)), np.ones(len(player))], table['player']))
+  table = {key: values[order] for key, values in table.items()}
+  p = table['player']
+  n_rows = len(p)
+
+  ip = table['outs'] // 3 + table['outs'] % 3 / 10
+  ra9 = np.round(27 * table['runs'] / table['outs'], 2)
+  ra9avg = np.round(4.6 + .2 * rng.normal(size=n_rows), 2)
+  raa = np.round((ra9avg - ra9) * table['outs'] / 27).astype(np.int64)
+  waa = np.round(raa / 10, 1) + 0.0
+  war = np.round(waa + table['outs'] / 27 * .12, 1) + 0.0
+  # lognormal salaries around the league minimum with a long tail of big contracts, some players have none listed
+  minimum = rng.random(n) < .4
+  salary = np.where(minimum, 555000 + 500 * rng.integers(0, 60, n),
+                    np.clip(np.exp(14.7 + .6 * pool['pay'] + .3 * pool['skill'] + .7 * rng.normal(size=n)), 5e5, 4e7) // 500 * 500)
+  salary = np.where(rng.random(n) < salary_missing, np.nan, salary)
+
+  with np.errstate(invalid='ignore', divide='ignore'):
+    sv_pct = np.round(100 * table['saves'] / table['sv_opp']) / 100
+    is_pct = np.round(100 * table['stranded_in'] / table['inherited']) / 100
+  tm = np.where(table['team'] >= 0, teams[table['team']], 'TOT')
+  common = {'Name': names[p], 'Age': age[p], 'Tm': tm, 'IP': ip}
+  relief = table['relief']
+  poisson = rng.poisson
+  reliever = pd.DataFrame({'Rk': np.arange(1, n_rows + 1), **common, 'G': table['games'], 'GR': table['relief'],
+                           'GF': rng.binomial(relief, np.where(closer[p], .8, .25)), 'Wgr': poisson(relief * .04),
+                           'Lgr': poisson(relief * .04), 'SVOpp': table['sv_opp'], 'SV': table['saves'],
+                           'BSv': table['sv_opp'] - table['saves'], 'SV%': sv_pct, 'SVSit': table['sv_opp'] + poisson(relief * .1),
+                           'Hold': poisson(relief * .15), 'IR': table['inherited'], 'IS': table['stranded_in'], 'IS%': is_pct,
+                           '1stIP': pd.array(np.where(table['team'] >= 0, rng.integers(1, 10, n_rows), np.nan), dtype='Int64'),
+                           'aLI': np.round(rng.gamma(4, .25, n_rows), 3), 'LevHi': poisson(relief * .3),
+                           'LevMd': poisson(relief * .25), 'LevLo': poisson(relief * .45), 'Ahd': poisson(relief * .35),
+                           'Tie': poisson(relief * .1), 'Bhd': poisson(relief * .55), 'Runr': poisson(relief * .4),
+                           'Empt': poisson(relief * .6), '>3o': poisson(relief * .3), '<3o': poisson(relief * .3),
+                           'IPmult': poisson(relief * .35), '0DR': poisson(relief * .2),
+                           'Out/GR': np.round(table['outs'] / np.maximum(table['games'], 1), 1), 'Pit/GR': 10 + rng.poisson(7, n_rows)}, columns=RELIEVER_HEADER)
+  # only pitchers who came out of the bullpen are listed in the reliever table
+  reliever = reliever[relief > 0]
+  reliever['Rk'] = np.arange(1, len(reliever) + 1)
+  value = pd.DataFrame({'Rk': np.arange(1, n_rows + 1), **common, 'G': table['games'], 'GS': table['starts'], 'R': table['runs'],
+                        'RA9': ra9, 'RA9opp': ra9avg, 'RA9def': np.round(.2 * rng.normal(size=n_rows), 2),
+                        'RA9role': np.where(table['starts'] > table['relief'], 0.0, .2), 'PPFp': np.round(100 + 3 * rng.normal(size=n_rows), 1),
+                        'RA9avg': ra9avg, 'RAA': raa, 'WAA': waa, 'gmLI': np.round(rng.gamma(4, .25, n_rows), 2),
+                        'WAAadj': np.round(.1 * rng.normal(size=n_rows), 1), 'WAR': war, 'RAR': np.round(war * 10).astype(np.int64),
+                        'waaWL%': np.round(.5 + waa / 200, 3), '162WL%': np.round(.5 + waa / 3200, 3), 'Salary': salary[p],
+                        'Acquired': np.array(ACQUIRED)[rng.integers(0, len(ACQUIRED), n)][p]}, columns=VALUE_HEADER)
+  value['Tm'] = np.where(table['team'] >= 0, tm, '2TM')
+  return reliever.reset_index(drop=True), value
+
+def synthetic_league(start_year=2000, n_seasons=20, n_players=800, n_teams=30, seed=0, retention=.75, traded_rate=.1,
+                     starter_rate=.12, salary_missing=.35):
+  '''
+  Generates reliever and value tables of made up seasons shaped like the scraped ones: the same columns, lognormal
+  salaries with many near the league minimum and about a third missing, SV% empty without save opportunities and IS%
+  without inherited runners, traded players listed as TOT in the reliever table and 2TM in the value table before their
+  team stints, and * after left handed names. Players carry over from season to season and age with it.
+  The same seed always generates the same league.
+
+  Parameters
+  ----------
+  start_year - int of first season
+
+  n_seasons - int of number of seasons
+
+  n_players - int of pitchers per season
+
+  n_teams - int of number of teams
+
+  seed - int seed of the random generator
+
+  retention - float share of pitchers coming back the next season
+
+  traded_rate, starter_rate, salary_missing - float shares of pitchers traded during the season, who never relieve and without a salary
+
+  Returns
+  ----------
+  iterator of (year, reliever dataframe, value dataframe) tuples from the first season to the last
+
+  '''
+  rng = np.random.default_rng(seed)
+  teams = team_codes(n_teams)
+  pool = None
+  for year in range(start_year, start_year + n_seasons):
+    pool = _pool(rng, pool, year, n_players, retention)
+    order = np.argsort(pool['name'], kind='stable')
+    pool = {key: (values[order] if key != 'next_id' else values) for key, values in pool.items()}
+    reliever, value = _season(rng, pool, year, teams, traded_rate, starter_rate, salary_missing)
+    yield year, reliever, value
+
+def _lookup_text(values, scale):
+  '''
+  Returns the cells of a numeric column formatting each distinct value only once, or None when scale does not
+  recover the values exactly, e.g. floats with more than 3 decimals
+  '''
+  scaled = np.round(values * scale).astype(np.int64)
+  low, high = scaled.min(initial=0), scaled.max(initial=0)
+  if high - low < 2 * len(scaled):
+    # small ranges, like most counting columns, index a table of the whole range without sorting
+    uniques, inverse = np.arange(low, high + 1), scaled - low
+  else:
+    uniques, inverse = np.unique(scaled, return_inverse=True)
+  uniques = uniques / scale if scale > 1 else uniques
+  if not np.array_equal(uniques[inverse], values):
+    return None
+  return list(map(uniques.astype(str).tolist().__getitem__, inverse.tolist()))
+
+def _column_text(column):
+  '''
+  Returns the cells of a column as written in the scraped csv files: % and $ columns with their signs, empty cells for NaN
+  '''
+  missing = column.isna().to_numpy()
+  if column.name == 'Salary':
+    return ['' if salary != salary else f'"${salary:,.0f}"' for salary in column.tolist()]
+  if column.name in ('SV%', 'IS%'):
+    text = [f'{percent}%' for percent in _lookup_text(np.round(column.fillna(0).to_numpy() * 100), 1)]
+  elif column.dtype.kind in 'iuf':
+    values = column.fillna(0).to_numpy(np.int64 if column.dtype.kind != 'f' else float)
+    text = _lookup_text(values, 1 if column.dtype.kind != 'f' else 1000) or values.astype(str).tolist()
+  else:
+    text = column.tolist()
+  return [cell if not skip else '' for cell, skip in zip(text, missing)] if missing.any() else text
+
+def _footer(df):
+  '''
+  Returns the league total row, shifted left like the scraped one so a number sits where the names are
+  '''
+  ip = df['IP'].to_numpy()
+  outs = (ip // 1 * 3 + np.round(ip % 1 * 10)).sum()
+  totals = [f'{outs // 3:.0f}.{outs % 3:.0f}', str(df['G'].sum())]
+  return totals + [''] * (len(df.columns) - len(totals) - 1)
+
+def write_table(df, file):
+  '''
+  Writes a table of synthetic_league as a scraped csv file: an index column, the header repeated every 25 players
+  and the league total row at the bottom. Columns are turned into text whole, which is much faster than DataFrame.to_csv.
+
+  Parameters
+  ----------
+  df - reliever or value dataframe of synthetic_league
+
+  file - str of path to csv file e.g. 'data/2019-value.csv'
+
+  '''
+  header = ','.join(df.columns)
+  index = np.arange(len(df)) + np.arange(len(df)) // HEADER_EVERY
+  columns = [index.astype(str).tolist()] + [_column_text(df[col_name]) for col_name in df.columns]
+  lines = list(map(','.join, zip(*columns)))
+  parts = [',' + header]
+  for start in range(0, len(lines), HEADER_EVERY):
+    if start:
+      parts.append(f'{start + start // HEADER_EVERY - 1},{header}')
+    parts.extend(lines[start:start + HEADER_EVERY])
+  parts.append(','.join([str(len(lines) + (len(lines) - 1) // HEADER_EVERY)] + _footer(df)))
+  with open(file, 'w') as f:
+    f.write('\n'.join(parts) + '\n')
+
+def write_league(directory, start_year=2000, n_seasons=20, n_players=800, n_teams=30, seed=0, **kwargs):
+  '''
+  Writes the seasons of synthetic_league as {year}-reliever.csv and {year}-value.csv files, ready for source_to_df and load_dfs
+
+  Parameters
+  ----------
+  directory - str of directory to write to
+
+  start_year, n_seasons, n_players, n_teams, seed, kwargs - passed to synthetic_league
+
+  Returns
+  ----------
+  tuple of int of first and last season written
+
+  '''
+  os.makedirs(directory, exist_ok=True)
+  for year, reliever, value in synthetic_league(start_year, n_seasons, n_players, n_teams, seed, **kwargs):
+    write_table(reliever, f'{directory}/{year}-reliever.csv')
+    write_table(value, f'{directory}/{year}-value.csv')
+  return start_year, start_year + n_seasons - 1
+
+def synthetic_dfs(start_year=2000, n_seasons=20, n_players=800, n_teams=30, seed=0, col_names=['RAA','RAR', 'RA9', 'WAA', 'WAR'],
+                  min_gr_pct=.50, min_gr=5, **kwargs):
+  '''
+  Returns cleaned seasons of synthetic_league without writing any csv file, the same dataframes load_dfs returns
+  for the files write_league writes
+
+  Parameters
+  ----------
+  start_year, n_seasons, n_players, n_teams, seed, kwargs - passed to synthetic_league
+
+  col_names, min_gr_pct, min_gr - cleaning parameters passed to prepare_dfs
+
+  Returns
+  ----------
+  list of cleaned dataframes from the latest season to the earliest, as load_dfs orders them
+
+  '''
+  relievers, salaries = [], []
+  for year, reliever, value in synthetic_league(start_year, n_seasons, n_players, n_teams, seed, **kwargs):
+    for tables, df, schema in ((relievers, reliever, RELIEVER_SCHEMA), (salaries, value, VALUE_SCHEMA)):
+      df = df[list(schema)].astype(schema)
+      df['file_year'] = str(year)
+      tables.insert(0, df)
+  return prepare_dfs(relievers, salaries, col_names, min_gr_pct, min_gr)
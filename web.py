@@ -1,8 +1,17 @@
-from selenium import webdriver
 import pandas as pd
+import numpy as np
+import io
 import os
 import glob
 import re
+import csv
+import itertools
+import time
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from manifest import load_manifest, save_manifest, record_fetch, missing_pages
+from instrument import stage
 
 # Have to use selenium because using panda to read html directly from the hyperlink only finds the first table.
 
@@ -24,6 +33,7 @@ def get_html(link):
       
     '''
 
+    from selenium import webdriver
     options = webdriver.ChromeOptions()
     driver = webdriver.Chrome(options=options)
     driver.get(link)
@@ -31,7 +41,257 @@ def get_html(link):
     driver.quit()
     return html
 
-def source_to_df(start_year, end_year, directory='rp_data', download=False):
+PAGE_URL = 'https://www.baseball-reference.com/leagues/MLB/{year}-{page}-pitching.shtml'
+PAGE_TYPES = ['value', 'reliever']
+# id of the player stats table on each page type
+TABLE_IDS = {'value': 'players_value_pitching', 'reliever': 'players_reliever_pitching'}
+
+def extract_table(html, table_id):
+  '''
+      Returns the table with table_id from a page source as a dataframe, parsing only that table with lxml.
+      The table is cut out of the raw source first, so tables baseball-reference hides inside html comments are found too.
+      Cells are read the way pd.read_html reads them (whitespace collapsed, colspans repeated, ragged rows padded,
+      numbers with thousands separators parsed) and handed to the c csv parser, so the frame matches pd.read_html on the same table.
+      Falls back to the last table of the page, like pd.read_html(html)[-1], when there is no table with that id.
+
+      Parameters
+      ----------
+      html - str of page source
+
+      table_id - str of id of the table e.g. 'players_value_pitching'
+
+      Returns
+      -------
+      Dataframe
+  '''
+  found = re.search(f'<table[^>]*id=["\']{re.escape(table_id)}["\']', html)
+  if found is None:
+    return pd.read_html(io.StringIO(html))[-1]
+  from lxml import etree
+  end = html.find('</table>', found.end())
+  table = etree.HTML(html[found.start():end + len('</table>')]).find('.//table')
+  def rows(path):
+    return [[text for cell in tr if cell.tag in ('td', 'th') for text in [_cell_text(cell)] * int(cell.get('colspan', 1))]
+            for tr in table.iterfind(path)]
+  head = rows('./thead/tr')
+  body = rows('./tbody/tr') or rows('./tr')
+  data = head[-1:] + body + rows('./tfoot/tr')
+  width = max(len(row) for row in data)
+  text = io.StringIO()
+  csv.writer(text).writerows(row + [''] * (width - len(row)) for row in data)
+  text.seek(0)
+  return pd.read_csv(text, header=0 if head else None, thousands=',')
+
+def _cell_text(cell):
+  text = ''.join(cell.itertext()) if len(cell) else (cell.text or '')
+  if '\n' in text or '\r' in text or '  ' in text:
+    text = re.sub(r'[\r\n]+|\s{2,}', ' ', text)
+  return text.strip()
+
+class driver_pool():
+  def __init__(self, size=2):
+    '''
+      Pool of reusable Chrome sessions used as a fetcher: calling it with a link returns the page source
+      from an idle session, starting at most size sessions and waiting for one to free up beyond that.
+
+      Parameters
+      ----------
+      size - int of most sessions open at once
+    '''
+    self.size = size
+    self.idle = []
+    self.drivers = []
+    # sessions being started count against size so callers waiting on a full pool are not outnumbered
+    self.starting = 0
+    self.changed = threading.Condition()
+
+  def acquire(self):
+    '''
+      Returns an idle session, starting a new one while the pool has fewer than size, otherwise waits until
+      a session is released or discarded
+    '''
+    with self.changed:
+      while not self.idle and len(self.drivers) + self.starting >= self.size:
+        self.changed.wait()
+      if self.idle:
+        return self.idle.pop()
+      self.starting += 1
+    try:
+      from selenium import webdriver
+      driver = webdriver.Chrome(options=webdriver.ChromeOptions())
+    except Exception:
+      with self.changed:
+        self.starting -= 1
+        self.changed.notify()
+      raise
+    with self.changed:
+      self.starting -= 1
+      self.drivers.append(driver)
+    return driver
+
+  def release(self, driver):
+    '''
+      Returns a session to the pool for the next caller
+    '''
+    with self.changed:
+      self.idle.append(driver)
+      self.changed.notify()
+
+  def discard(self, driver):
+    '''
+      Quits a session and removes it from the pool, freeing its place for a new one
+    '''
+    with self.changed:
+      self.drivers.remove(driver)
+      self.changed.notify()
+    try:
+      driver.quit()
+    except Exception:
+      pass
+
+  def __call__(self, link):
+    '''
+      Returns the page source of link, fetched with a session of the pool
+    '''
+    driver = self.acquire()
+    try:
+      driver.get(link)
+      html = driver.page_source
+    except Exception:
+      # a session that failed may be in a bad state, the retry gets a fresh one
+      self.discard(driver)
+      raise
+    self.release(driver)
+    return html
+
+  def close(self):
+    '''
+      Quits every session of the pool
+    '''
+    with self.changed:
+      drivers, self.drivers, self.idle = self.drivers, [], []
+      self.changed.notify_all()
+    for driver in drivers:
+      driver.quit()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+def file_fetcher(directory):
+  '''
+      Returns a fetcher reading saved pages from directory instead of the web, e.g. 'fixtures/2019-value-pitching.shtml'
+
+      Parameters
+      ----------
+      directory - str of directory holding the saved pages
+
+      Returns
+      -------
+      function taking a link and returning the page source
+  '''
+  def fetch(link):
+    with open(os.path.join(directory, link.rsplit('/', 1)[-1]), encoding='utf-8') as f:
+      return f.read()
+  return fetch
+
+def url_fetcher(base_url='https://www.baseball-reference.com', timeout=30):
+  '''
+      Returns a fetcher downloading pages over plain http from base_url, e.g. a local stand-in server 'http://localhost:8000'
+
+      Parameters
+      ----------
+      base_url - str replacing the baseball-reference host of each link
+
+      timeout - seconds to wait for a response
+
+      Returns
+      -------
+      function taking a link and returning the page source
+  '''
+  def fetch(link):
+    link = link.replace('https://www.baseball-reference.com', base_url.rstrip('/'), 1)
+    with urllib.request.urlopen(link, timeout=timeout) as response:
+      return response.read().decode('utf-8')
+  return fetch
+
+def fetch_table(year, page, directory, fetcher, retries=3, backoff=1.0):
+  '''
+      Fetches one page, parses its player stats table and writes it to directory/year-page.csv right away
+
+      Parameters
+      ----------
+      year - int of season
+
+      page - 'value' or 'reliever'
+
+      directory - str of directory to write to
+
+      fetcher - function taking a link and returning the page source
+
+      retries - int of extra attempts after a failed fetch or parse
+
+      backoff - seconds to wait before the first retry, doubled after each failure
+
+      Returns
+      -------
+      Str of path of the written csv file
+  '''
+  link = PAGE_URL.format(year=year, page=page)
+  for attempt in range(retries + 1):
+    try:
+      table = extract_table(fetcher(link), TABLE_IDS[page])
+      break
+    except Exception:
+      if attempt == retries:
+        raise
+      time.sleep(backoff * 2**attempt)
+  path = f'{directory}/{year}-{page}.csv'
+  table.to_csv(path)
+  return path
+
+def fetch_tables(pairs, directory, fetcher=None, workers=2, retries=3, backoff=1.0, manifest=None):
+  '''
+      Fetches pages concurrently, at most workers pages at a time
+
+      Parameters
+      ----------
+      pairs - list of (year, page) tuples e.g. [(2019, 'value'), (2019, 'reliever')]
+
+      directory - str of directory to write to, created if needed
+
+      fetcher - function taking a link and returning the page source, defaults to a driver_pool of workers Chrome sessions
+
+      workers - int of pages fetched at once
+
+      retries, backoff - passed to fetch_table
+
+      manifest - dict from load_manifest, every fetched page is recorded in it and saved as soon as it is written
+
+      Returns
+      -------
+      List of str of paths of the written csv files, in the order of pairs
+  '''
+  os.makedirs(directory, exist_ok=True)
+  pool = driver_pool(workers) if fetcher is None else None
+  try:
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+      futures = {executor.submit(fetch_table, year, page, directory, fetcher or pool, retries, backoff): (year, page)
+                 for year, page in pairs}
+      for future in as_completed(futures):
+        if manifest is not None and future.exception() is None:
+          record_fetch(manifest, *futures[future], future.result())
+          save_manifest(directory, manifest)
+      return [future.result() for future in futures]
+  finally:
+    if pool is not None:
+      pool.close()
+
+@stage()
+def source_to_df(start_year, end_year, directory='rp_data', download=False, typed=False, fetcher=None, workers=2,
+                 incremental=False, refresh=(), stream=False, chunksize=None):
   '''
       Downloads page source as panda dataframes to csv files from range of year to specified directory (default as /rp_data)
       if it doesn't already exist, if it does exist, it will read the csv files from the folder.
@@ -45,49 +305,197 @@ def source_to_df(start_year, end_year, directory='rp_data', download=False):
 
       directory - str of directory name e.g 'data'
 
+      typed - read the csv files with read_typed_csv, keeping only the columns the analysis uses
+
+      fetcher - function taking a link and returning the page source, defaults to pooled Chrome sessions
+
+      workers - int of pages downloaded at once
+
+      incremental - only download the pages without a csv file yet and the seasons in refresh,
+      recording each download in the directory's manifest.json
+
+      refresh - list of int of seasons to download again in incremental mode, e.g. a season still in progress
+
+      stream - return stream_seasons(start_year, end_year, directory, chunksize) instead of reading every csv file,
+      yielding one season, or chunks of chunksize reliever rows, at a time
+
       source_to_df(2015, 2019, 'data')
 
       Returns
       -------
-      Tuple of scraped relievers and salaries dataframes
+      Tuple of scraped relievers and salaries dataframes, or an iterator of (relievers, salaries) tuples when streaming
   '''
   if download == True:
-    for num in range(start_year, (end_year+1)):
-      html = get_html(f'https://www.baseball-reference.com/leagues/MLB/{num}-value-pitching.shtml')
-      table = pd.read_html(html)
-      if os.path.exists(f'{directory}') == True:
-        table[-1].to_csv(f'{directory}/{num}-value.csv')
-      else:
-        os.mkdir(f'{directory}')
-        table[-1].to_csv(f'{directory}/{num}-value.csv')
-
-    #Reliever stats for the last 5 years:
-    for num in range(start_year, (end_year+1)):
-      html = get_html(f'https://www.baseball-reference.com/leagues/MLB/{num}-reliever-pitching.shtml')
-      table = pd.read_html(html)
-      if os.path.exists(f'{directory}') == True:
-        table[-1].to_csv(f'{directory}/{num}-reliever.csv')
-      else:
-        os.mkdir(f'{directory}')
-        table[-1].to_csv(f'{directory}/{num}-reliever.csv')
+    years = range(start_year, (end_year+1))
+    if incremental == True:
+      os.makedirs(directory, exist_ok=True)
+      fetch_tables(missing_pages(directory, years, PAGE_TYPES, refresh), directory, fetcher, workers, manifest=load_manifest(directory))
+    else:
+      fetch_tables([(year, page) for year in years for page in PAGE_TYPES], directory, fetcher, workers)
+  if stream == True:
+    return stream_seasons(start_year, end_year, directory, chunksize)
   
   relievers_csv = glob.glob(f'{directory}/*-reliever*')
   relievers_csv.sort(reverse=True)
   salaries_csv = glob.glob(f'{directory}/*-value*')
   salaries_csv.sort(reverse=True)
 #Extracting file names into a list
-  relievers = []
-  salaries = []
-  for file in relievers_csv:
-      path, filename = os.path.split(file)
-      year = re.findall('\d\d\d\d', filename)[0] #find only strings of 4 digits
-      temp_df = pd.read_csv(file)
-      temp_df['file_year'] = year #append year as a column to file as a reference
-      relievers.append(temp_df)
-  for file in salaries_csv:
-      path, filename = os.path.split(file)
-      year = re.findall('\d\d\d\d', filename)[0]
-      temp_df = pd.read_csv(file)
-      temp_df['file_year'] = year
-      salaries.append(temp_df)
-  return (relievers, salaries)
\ No newline at end of file
+  relievers = [csv_to_df(file, typed) for file in relievers_csv]
+  salaries = [csv_to_df(file, typed) for file in salaries_csv]
+  return (relievers, salaries)
+
+def csv_year(file):
+  '''
+      Returns the season of a scraped csv file from its file name
+
+      Parameters
+      ----------
+      file - str of path to csv file e.g. 'data/2019-value.csv'
+
+      Returns
+      -------
+      Str of the year
+  '''
+  path, filename = os.path.split(file)
+  return re.findall('\d\d\d\d', filename)[0] #find only strings of 4 digits
+
+@stage()
+def csv_to_df(file, typed=False):
+  '''
+      Reads a scraped csv file into a dataframe with the season appended as the file_year column
+
+      Parameters
+      ----------
+      file - str of path to csv file e.g. 'data/2019-value.csv'
+
+      typed - read the file with read_typed_csv instead of letting pandas infer every column
+
+      Returns
+      -------
+      Dataframe
+  '''
+  if typed == True:
+    temp_df = read_typed_csv(file)
+  else:
+    temp_df = pd.read_csv(file)
+  temp_df['file_year'] = csv_year(file) #append year as a column to file as a reference
+  return temp_df
+
+def percent_column(values):
+  '''
+      Converts a column of % strings from the csv files into fractions in one vectorized pass, empty cells become NaN
+
+      Parameters
+      ----------
+      values - Series of str e.g. ['23%', NaN, '100%']
+
+      Returns
+      -------
+      Series of float
+  '''
+  return pd.to_numeric(values.str.rstrip('%'), errors='coerce') / 100
+
+# Columns of the scraped tables used by clean_df, with their dtypes. Everything else is skipped while parsing.
+# % and $ signs are stripped from the raw csv so the % columns and Salary parse as numbers, the % columns are divided by 100 after.
+RELIEVER_SCHEMA = {'Name': str, 'Age': np.int16, 'Tm': str, 'G': np.int16, 'GR': np.int16, 'SV%': np.float64, 'IS%': np.float64}
+VALUE_SCHEMA = {'Name': str, 'Age': np.int16, 'Tm': str, 'G': np.int16,
+                'RA9': np.float64, 'RAA': np.float64, 'RAR': np.float64, 'WAA': np.float64, 'WAR': np.float64, 'Salary': np.float64}
+PERCENT_COLUMNS = ['SV%', 'IS%']
+
+def _typed_csv_parts(file):
+  '''
+  Returns the schema of a scraped csv file and the pattern matching the rows to drop before parsing
+  '''
+  schema = RELIEVER_SCHEMA if 'reliever' in os.path.basename(file) else VALUE_SCHEMA
+  with open(file, 'rb') as f:
+    header = f.readline()
+  # repeated header rows only differ from the first line by the leading index column,
+  # the league total row at the bottom of the table is shifted so its Name column holds a number
+  repeated = re.escape(header.split(b',', 1)[1].rstrip(b'\r\n'))
+  skipped = re.compile(rb'^[^,\n]*,(' + repeated + rb'|[^,\n]*,\d+,.*)\r?(\n|$)', re.M)
+  return header, skipped, schema
+
+def _parse_typed(header, body, skipped, schema):
+  body = skipped.sub(b'', body).replace(b'%', b'').replace(b'$', b'')
+  df = pd.read_csv(io.BytesIO(header + body), usecols=list(schema), dtype=schema, thousands=',')
+  for col_name in PERCENT_COLUMNS:
+    if col_name in df:
+      df[col_name] /= 100
+  return df
+
+def read_typed_csv(file):
+  '''
+      Reads a scraped reliever or value csv file in one pass with its columns and dtypes declared up front.
+      The header rows baseball-reference repeats inside the table and the league total row are dropped before parsing,
+      % columns become fractions and Salary a float with NaN for players without one.
+
+      Parameters
+      ----------
+      file - str of path to csv file e.g. 'data/2019-value.csv'
+
+      Returns
+      -------
+      Dataframe
+  '''
+  header, skipped, schema = _typed_csv_parts(file)
+  with open(file, 'rb') as f:
+    f.readline()
+    body = f.read()
+  return _parse_typed(header, body, skipped, schema)
+
+def read_typed_chunks(file, chunksize=10000):
+  '''
+      Reads a scraped csv file like read_typed_csv, chunksize lines at a time, so only one chunk of the file is held in memory
+
+      Parameters
+      ----------
+      file - str of path to csv file e.g. 'data/2019-value.csv'
+
+      chunksize - int of lines per chunk
+
+      Returns
+      -------
+      Iterator of dataframes, chunks holding only dropped rows are skipped
+  '''
+  header, skipped, schema = _typed_csv_parts(file)
+  with open(file, 'rb') as f:
+    f.readline()
+    while True:
+      lines = list(itertools.islice(f, chunksize))
+      if not lines:
+        return
+      df = _parse_typed(header, b''.join(lines), skipped, schema)
+      if len(df):
+        yield df
+
+def stream_seasons(start_year, end_year, directory='data', chunksize=None):
+  '''
+      Yields the reliever and value tables of each season from the latest to the earliest, like source_to_df orders them,
+      reading one season at a time. With a chunksize the reliever table is read in chunks of rows, each paired with the
+      season's whole value table (only the columns clean_df uses), so a season's value table is always held in full.
+
+      Parameters
+      ----------
+      start_year - int of earliest season e.g. 2015
+
+      end_year - int of last season e.g. 2019
+
+      directory - str of directory holding the scraped csv files
+
+      chunksize - int of reliever rows per chunk, None yields whole seasons
+
+      Returns
+      -------
+      Iterator of tuples of a reliever dataframe and the value dataframe of its season
+  '''
+  for year in range(end_year, start_year - 1, -1):
+    reliever_csv, value_csv = f'{directory}/{year}-reliever.csv', f'{directory}/{year}-value.csv'
+    if not (os.path.exists(reliever_csv) and os.path.exists(value_csv)):
+      continue
+    values = csv_to_df(value_csv, typed=True)
+    if chunksize is None:
+      yield csv_to_df(reliever_csv, typed=True), values
+      continue
+    for relievers in read_typed_chunks(reliever_csv, chunksize):
+      relievers['file_year'] = csv_year(reliever_csv)
+      yield relievers, values